@@ -0,0 +1,115 @@
+import io
+import os
+import posixpath
+import zipfile
+from fnmatch import fnmatch
+from typing import Iterator, List, Optional
+
+# Never packaged: environments, caches, byte code, VCS metadata and the
+# temporary files of atomic writes.
+DEFAULT_EXCLUDE = [
+    "venv/", ".venv/", "__pycache__/", ".pytest_cache/", ".mypy_cache/", ".ruff_cache/",
+    ".tox/", ".nox/", ".git/", "node_modules/", "*.egg-info/", "*.pyc", "*.pyo", ".*.tmp", ".DS_Store",
+]
+
+# Rules of the packaged files: ARTIFACT_INCLUDE and ARTIFACT_EXCLUDE take comma
+# separated rules, and excluded ones are added to DEFAULT_EXCLUDE.
+ARTIFACT_INCLUDE = [rule.strip() for rule in os.getenv("ARTIFACT_INCLUDE", "*").split(",") if rule.strip()]
+ARTIFACT_EXCLUDE = DEFAULT_EXCLUDE + [rule.strip() for rule in os.getenv("ARTIFACT_EXCLUDE", "").split(",") if rule.strip()]
+
+# Files are read and compressed this many bytes at a time.
+CHUNK_SIZE = 1024 * 1024
+
+
+class _Sink(io.RawIOBase):
+
+    """Unseekable file object collecting what zipfile writes, so the
+    archive can be handed out piece by piece. zipfile then writes data
+    descriptors instead of seeking back to the local headers."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def matches(path: str, pattern: str, is_dir: bool = False) -> bool:
+
+    """Matches a project path against a rule. "name/" matches directories
+    with that name at any depth, patterns containing "/" match the whole
+    path and other patterns match the file name."""
+
+    if pattern.endswith("/"):
+        return is_dir and fnmatch(posixpath.basename(path), pattern[:-1])
+    if "/" in pattern:
+        return fnmatch(path, pattern)
+    return fnmatch(posixpath.basename(path), pattern)
+
+
+def project_entries(folder_path: str, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None) -> List[str]:
+
+    """
+    Returns the files of a project folder that go into its artifact, as
+    sorted paths relative to the folder.
+
+    Args:
+        folder_path (str): Root folder of the project.
+        include (Optional[List[str]]): File rules of which one must match, ARTIFACT_INCLUDE by default.
+        exclude (Optional[List[str]]): File and directory rules of which none may match,
+            ARTIFACT_EXCLUDE by default. Excluded directories are not walked.
+    """
+
+    include = ARTIFACT_INCLUDE if include is None else include
+    exclude = ARTIFACT_EXCLUDE if exclude is None else exclude
+    entries = []
+    for root, dirs, files in os.walk(folder_path):
+        relative_root = os.path.relpath(root, folder_path).replace(os.sep, "/")
+        relative_root = "" if relative_root == "." else relative_root
+        dirs[:] = [
+            name for name in dirs
+            if not any(matches(posixpath.join(relative_root, name), pattern, is_dir=True) for pattern in exclude)
+        ]
+        for name in files:
+            path = posixpath.join(relative_root, name)
+            if any(matches(path, pattern) for pattern in include) and not any(matches(path, pattern) for pattern in exclude):
+                entries.append(path)
+    return sorted(entries)
+
+
+def stream_zip(folder_path: str, file_paths: List[str]) -> Iterator[bytes]:
+
+    """
+    Yields a zip archive of project files piece by piece, so it can be sent
+    or written without building it in memory or on disk first. Files are
+    read and compressed in CHUNK_SIZE pieces and keep their permissions and
+    modification times; ZIP64 records are added where needed.
+
+    Args:
+        folder_path (str): Root folder of the project.
+        file_paths (List[str]): Files to archive, relative to folder_path, e.g. from project_entries.
+    """
+
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for path in file_paths:
+            full_path = os.path.join(folder_path, path)
+            info = zipfile.ZipInfo.from_file(full_path, arcname=path)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(full_path, "rb") as source, archive.open(info, "w") as target:
+                while chunk := source.read(CHUNK_SIZE):
+                    target.write(chunk)
+                    data = sink.take()
+                    if data:
+                        yield data
+    yield sink.take()
+
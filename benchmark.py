@@ -0,0 +1,301 @@
+"""
+Offline benchmark of the workflow graph.
+
+Drives the compiled workflow end to end over synthetic SRD documents with a
+deterministic fake chat model, so scheduler and I/O changes can be measured
+reproducibly without network access. For every project size it reports the
+throughput, per-node latency percentiles and peak memory, and it can compare
+the results against a stored baseline to serve as a regression gate:
+
+    python benchmark.py --sizes 10 100 1000 --output results.json
+    python benchmark.py --baseline results.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List, Optional
+
+# Must be set before workflow loads .env, so no run is traced to LangSmith.
+os.environ["LANGSMITH_TRACING"] = "false"
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import workflow
+
+COMPONENT_PATTERN = re.compile(r"- Component (\w+):")
+TARGET_FILE_PATTERN = re.compile(r"specific file:\*\*\s+(\S+)")
+VALUE_PATTERN = re.compile(r"^VALUE_(\d+) = ", re.MULTILINE)
+DEFINITION_PATTERN = re.compile(r"VALUE_\d+ = \d+")
+BROKEN_IMPORT_PATTERN = re.compile(r"from (\S+) import MISSING_(\d+)")
+
+
+def synthetic_srd(components: int) -> str:
+
+    """Returns an SRD document describing the given number of components.
+    Large documents exceed SRD_CHUNK_CHARS and are planned from summaries."""
+
+    lines = ["Software Requirements Document", "", "The system consists of the following components:"]
+    for index in range(components):
+        lines.append(f"- Component component_{index}: stores record {index} and exposes it to the components that use it.")
+    return "\n".join(lines)
+
+
+class FakeChatModel(BaseChatModel):
+
+    """
+    A deterministic chat model that answers every workflow prompt with
+    canned output after a fixed delay.
+
+    The planner turns each component of a synthetic SRD into a module that
+    imports the module of component index // 10. Every review_every-th
+    module is reviewed once before it converges, and every broken_every-th
+    module is generated with a broken import that validation sends to repair.
+    Improvements and repairs are answered with SEARCH/REPLACE edits when the
+    prompt asks for them and with the whole file otherwise.
+    """
+
+    latency: float = 0.05
+    token_latency: float = 0.0
+    completion_tokens: int = 200
+    review_every: int = 4
+    broken_every: int = 50
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def _module_code(self, index: int, broken: bool = False) -> str:
+        lines = []
+        if index:
+            dependency = index // 10
+            name = f"MISSING_{dependency}" if broken else f"VALUE_{dependency}"
+            lines.append(f"from app.component_{dependency} import {name}")
+        lines += [
+            f"VALUE_{index} = {index}",
+            "",
+            "",
+            f"def component_{index}() -> int:",
+            f"    return VALUE_{index}",
+        ]
+        code = "\n".join(lines)
+        # Padding so the answer has roughly completion_tokens tokens.
+        padding = max(0, self.completion_tokens * 4 - len(code))
+        return code + "".join(f"\n# {'x' * 70}" for _ in range(padding // 73))
+
+    def _file_code(self, file_path: str, broken_allowed: bool) -> str:
+        match = re.fullmatch(r"app/component_(\d+)\.py", file_path)
+        if match is None:
+            return "" if file_path.endswith(".py") else "# Benchmark project"
+        index = int(match.group(1))
+        broken = broken_allowed and self.broken_every and index % self.broken_every == self.broken_every - 1
+        return self._module_code(index, broken)
+
+    def _edit_answer(self, prompt: str) -> str:
+        if "failed with errors" in prompt:
+            match = BROKEN_IMPORT_PATTERN.search(prompt)
+            if match is None:
+                return workflow.NO_CHANGES_MARKER
+            search, replace = match.group(0), f"from {match.group(1)} import VALUE_{match.group(2)}"
+        else:
+            match = DEFINITION_PATTERN.search(prompt)
+            if match is None:
+                return workflow.NO_CHANGES_MARKER
+            search, replace = match.group(0), f"{match.group(0)}  # reviewed"
+        return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE"
+
+    def answer(self, prompt: str) -> str:
+
+        """Returns the canned answer to a workflow prompt."""
+
+        if "SEARCH/REPLACE" in prompt:
+            return self._edit_answer(prompt)
+
+        if "The following is part" in prompt:
+            return "\n".join(f"- Component {name}: requirements" for name in COMPONENT_PATTERN.findall(prompt))
+
+        if "software architect" in prompt:
+            components = COMPONENT_PATTERN.findall(prompt)
+            files = ["app/__init__.py"] + [f"app/{name}.py" for name in components] + ["README.md"]
+            descriptions = {"app/__init__.py": "Marks app as a package.", "README.md": "Describes the project."}
+            for index, name in enumerate(components):
+                uses = f" Uses VALUE_{index // 10} from app/component_{index // 10}.py." if index else ""
+                descriptions[f"app/{name}.py"] = f"Defines VALUE_{index} and {name}().{uses}"
+            return "```json\n" + json.dumps({"files": files, "descriptions": descriptions}) + "\n```"
+
+        if "senior software reviewer" in prompt:
+            match = VALUE_PATTERN.search(prompt)
+            if match and "# reviewed" not in prompt and int(match.group(1)) % self.review_every == 0:
+                return "Add a docstring to the function."
+            return workflow.NO_CHANGES_MARKER
+
+        if "software tester" in prompt:
+            return "def test_module():\n    assert True"
+
+        target = TARGET_FILE_PATTERN.search(prompt)
+        file_path = target.group(1) if target else ""
+        if "Improve the following Python code" in prompt:
+            return self._file_code(file_path, broken_allowed=False) + "\n# reviewed"
+        if "failed with errors" in prompt:
+            return self._file_code(file_path, broken_allowed=False)
+        return self._file_code(file_path, broken_allowed=True)
+
+    def _respond(self, messages) -> tuple:
+        prompt = messages[-1].content
+        text = self.answer(prompt)
+        time.sleep(self.latency + self.token_latency * self.completion_tokens)
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4}
+        return text, usage
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text, usage = self._respond(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text, usage = self._respond(messages)
+        lines = text.split("\n")
+        for index, line in enumerate(lines):
+            last = index == len(lines) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=line if last else line + "\n",
+                usage_metadata=usage if last else None,
+            ))
+
+
+def run_benchmark(components: int, work_dir: str) -> Dict[str, Any]:
+
+    """Runs the workflow once for a synthetic SRD and returns its
+    throughput, per-node latencies and peak memory."""
+
+    folder_path = os.path.join(work_dir, f"project_{components}", "generated_project")
+    thread_id = f"benchmark-{components}-{int(time.time())}"
+
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    final_state = workflow.run(synthetic_srd(components), folder_path, thread_id)
+    wall_seconds = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+
+    with open(os.path.join(os.path.dirname(folder_path), "profile.json"), "r") as f:
+        profile = json.load(f)
+
+    files = len(final_state["file_structure"])
+    llm_calls = sum(calls["count"] for calls in profile["llm_calls"].values())
+    return {
+        "components": components,
+        "files": files,
+        "wall_seconds": round(wall_seconds, 3),
+        "files_per_second": round(files / wall_seconds, 3),
+        "llm_calls": llm_calls,
+        "llm_calls_per_second": round(llm_calls / wall_seconds, 3),
+        "peak_memory_mb": round(peak_memory / (1024 * 1024), 3),
+        "nodes": {
+            node: {key: timing[key] for key in ("count", "p50_seconds", "p95_seconds", "max_seconds")}
+            for node, timing in profile["nodes"].items()
+        },
+    }
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+
+    """Returns a message for every size whose throughput dropped, or whose
+    peak memory grew, by more than tolerance relative to the baseline."""
+
+    regressions = []
+    baseline_by_size = {result["components"]: result for result in baseline}
+    for result in results:
+        reference = baseline_by_size.get(result["components"])
+        if reference is None:
+            continue
+        if result["files_per_second"] < reference["files_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{result['components']} components: throughput {result['files_per_second']} files/s "
+                f"is below the baseline of {reference['files_per_second']} files/s"
+            )
+        if result["peak_memory_mb"] > reference["peak_memory_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{result['components']} components: peak memory {result['peak_memory_mb']} MB "
+                f"is above the baseline of {reference['peak_memory_mb']} MB"
+            )
+    return regressions
+
+
+def print_report(result: dict) -> None:
+    print(
+        f"\n{result['components']} components, {result['files']} files: {result['wall_seconds']}s, "
+        f"{result['files_per_second']} files/s, {result['llm_calls']} model calls "
+        f"({result['llm_calls_per_second']}/s), peak memory {result['peak_memory_mb']} MB"
+    )
+    print(f"  {'node':<24}{'count':>8}{'p50 s':>12}{'p95 s':>12}{'max s':>12}")
+    for node, timing in sorted(result["nodes"].items(), key=lambda item: -item[1]["p95_seconds"]):
+        print(f"  {node:<24}{timing['count']:>8}{timing['p50_seconds']:>12.4f}{timing['p95_seconds']:>12.4f}{timing['max_seconds']:>12.4f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+
+    """Command line entry point. Returns 1 when a baseline comparison found
+    a regression."""
+
+    parser = argparse.ArgumentParser(description="Benchmark the workflow graph offline with a fake chat model.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Numbers of components of the synthetic SRDs.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds every model call takes.")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Additional seconds per completion token.")
+    parser.add_argument("--fast-latency", type=float, help="Seconds every call to the fast tier takes; by default it shares the strong model.")
+    parser.add_argument("--completion-tokens", type=int, default=200, help="Approximate tokens of every generated file.")
+    parser.add_argument("--run-mode", default="compile", choices=("run", "import", "compile"), help="RUN_MODE used by run_code.")
+    parser.add_argument("--work-dir", help="Directory the projects are generated in, a temporary one by default.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Results JSON of an earlier benchmark to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against the baseline.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="workflow-benchmark-")
+    os.makedirs(work_dir, exist_ok=True)
+
+    # Nothing is cached or installed, so every run does the full work offline.
+    workflow.RUN_MODE = args.run_mode
+    workflow.PLAN_CACHE_DIR = ""
+    workflow.INSTALL_DEPENDENCIES = False
+    workflow.CHECKPOINT_DB = os.path.join(work_dir, "checkpoints.sqlite")
+    fast_model = None
+    if args.fast_latency is not None:
+        fast_model = FakeChatModel(
+            latency=args.fast_latency, token_latency=args.token_latency, completion_tokens=args.completion_tokens,
+        )
+    workflow.use_model(FakeChatModel(
+        latency=args.latency, token_latency=args.token_latency, completion_tokens=args.completion_tokens,
+    ), fast_model)
+
+    tracemalloc.start()
+    results = []
+    for components in args.sizes:
+        result = run_benchmark(components, work_dir)
+        print_report(result)
+        results.append(result)
+    tracemalloc.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
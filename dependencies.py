@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from importlib.metadata import packages_distributions
+from typing import Dict, List, Optional
+
+from static_checks import external_imports, project_modules
+
+logger = logging.getLogger(__name__)
+
+# Distributions of the top-level modules generated projects commonly import.
+# Imports that are neither listed here nor provided by an installed
+# distribution are never installed, so an import of a module the project lacks
+# cannot pull a package of that name from the index.
+IMPORT_DISTRIBUTIONS = {
+    "aiofiles": "aiofiles",
+    "aiosqlite": "aiosqlite",
+    "alembic": "alembic",
+    "asyncpg": "asyncpg",
+    "attr": "attrs",
+    "bcrypt": "bcrypt",
+    "boto3": "boto3",
+    "bs4": "beautifulsoup4",
+    "celery": "celery",
+    "click": "click",
+    "Crypto": "pycryptodome",
+    "cv2": "opencv-python",
+    "databases": "databases",
+    "dateutil": "python-dateutil",
+    "docx": "python-docx",
+    "dotenv": "python-dotenv",
+    "email_validator": "email-validator",
+    "fastapi": "fastapi",
+    "httpx": "httpx",
+    "jinja2": "Jinja2",
+    "jose": "python-jose",
+    "jwt": "PyJWT",
+    "loguru": "loguru",
+    "magic": "python-magic",
+    "motor": "motor",
+    "multipart": "python-multipart",
+    "MySQLdb": "mysqlclient",
+    "numpy": "numpy",
+    "orjson": "orjson",
+    "pandas": "pandas",
+    "passlib": "passlib",
+    "PIL": "Pillow",
+    "psycopg2": "psycopg2-binary",
+    "pydantic": "pydantic",
+    "pydantic_settings": "pydantic-settings",
+    "pymongo": "pymongo",
+    "pytest": "pytest",
+    "redis": "redis",
+    "requests": "requests",
+    "sklearn": "scikit-learn",
+    "sqlalchemy": "SQLAlchemy",
+    "sqlmodel": "sqlmodel",
+    "starlette": "starlette",
+    "tenacity": "tenacity",
+    "typer": "typer",
+    "uvicorn": "uvicorn",
+    "yaml": "PyYAML",
+}
+
+# Written into an environment once all of its requirements are installed.
+COMPLETE_MARKER = ".complete"
+
+
+def distribution_name(module: str, installed: Dict[str, List[str]]) -> Optional[str]:
+
+    """Returns the distribution that provides a top-level module: a known
+    one, or the single installed distribution providing it. Returns None for
+    unknown modules."""
+
+    if module in IMPORT_DISTRIBUTIONS:
+        return IMPORT_DISTRIBUTIONS[module]
+    providers = installed.get(module, [])
+    if len(providers) == 1:
+        return providers[0]
+    return None
+
+
+def resolve_requirements(sources: Dict[str, str], file_structure: List[str]) -> List[str]:
+
+    """
+    Returns the distributions the Python files of a project import, sorted
+    and without duplicates. Standard library and project modules are left
+    out, including project modules imported by their own name, as generated
+    tests import e.g. app/main.py as `main`. Unknown modules are logged and
+    left out.
+
+    Args:
+        sources (Dict[str, str]): Source code keyed by project file path.
+        file_structure (List[str]): Every file of the project.
+    """
+
+    installed = packages_distributions()
+    project_names = {part for name in project_modules(file_structure) for part in name.split(".")}
+    requirements = {}
+    unknown = set()
+    for file_path, source in sources.items():
+        if not file_path.endswith(".py"):
+            continue
+        for module in external_imports(file_path, source, file_structure):
+            if module in sys.stdlib_module_names or module == "__future__" or module in project_names:
+                continue
+            distribution = distribution_name(module, installed)
+            if distribution is None:
+                unknown.add(module)
+                continue
+            requirements.setdefault(distribution.lower(), distribution)
+    if unknown:
+        logger.warning(f"Not installing unknown modules: {', '.join(sorted(unknown))}")
+    return [requirements[key] for key in sorted(requirements)]
+
+
+def requirements_hash(requirements: List[str]) -> str:
+
+    """Returns the key of the environment of a requirement set, which does
+    not depend on order or case."""
+
+    normalised = sorted({requirement.lower() for requirement in requirements})
+    return hashlib.sha256("\n".join(normalised).encode("utf-8")).hexdigest()[:16]
+
+
+def environment_python(environment_path: str) -> str:
+    if os.name == "nt":
+        return os.path.join(environment_path, "Scripts", "python.exe")
+    return os.path.join(environment_path, "bin", "python")
+
+
+class EnvironmentCache:
+
+    """
+    Virtual environments shared by every project with the same requirement
+    set, kept in cache_dir/venvs under the hash of the set. Packages are
+    installed from the wheelhouse in cache_dir/wheels; only wheels missing
+    from it are downloaded or built. Environments are prepared in background
+    threads, and a set that is already being prepared is not prepared again.
+    """
+
+    def __init__(self, cache_dir: str = ".dependency_cache", max_workers: int = 2, timeout: float = 600):
+        self.wheel_dir = os.path.abspath(os.path.join(cache_dir, "wheels"))
+        self.venv_dir = os.path.abspath(os.path.join(cache_dir, "venvs"))
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dependencies")
+
+    def prepare(self, requirements: List[str]) -> Future:
+
+        """Starts preparing the environment of a requirement set, unless it
+        is already prepared or being prepared, and returns the future of its
+        interpreter path. Failed preparations are started again."""
+
+        key = requirements_hash(requirements)
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._executor.submit(self._build, key, sorted(requirements))
+                self._futures[key] = future
+            return future
+
+    def _pip(self, python: str, *args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [python, "-m", "pip", "--disable-pip-version-check", *args],
+            capture_output=True, text=True, timeout=self.timeout,
+        )
+
+    def _build(self, key: str, requirements: List[str]) -> str:
+
+        """Creates the environment of a requirement set and returns its
+        interpreter. Requirements that cannot be installed are logged and
+        left out, and the environment is then prepared again by the next
+        process that uses it."""
+
+        environment_path = os.path.join(self.venv_dir, key)
+        python = environment_python(environment_path)
+        if os.path.exists(os.path.join(environment_path, COMPLETE_MARKER)):
+            return python
+
+        logger.info(f"Creating the environment {key} for {len(requirements)} requirements")
+        shutil.rmtree(environment_path, ignore_errors=True)
+        os.makedirs(self.wheel_dir, exist_ok=True)
+        subprocess.run([sys.executable, "-m", "venv", environment_path], check=True, capture_output=True, timeout=self.timeout)
+
+        installable = requirements
+        offline = ["install", "--no-index", "--find-links", self.wheel_dir]
+        if requirements and self._pip(python, *offline, *requirements).returncode != 0:
+            installable = []
+            for requirement in requirements:
+                result = self._pip(python, "wheel", "--find-links", self.wheel_dir, "--wheel-dir", self.wheel_dir, requirement)
+                if result.returncode == 0:
+                    installable.append(requirement)
+                else:
+                    logger.warning(f"Could not get a wheel for {requirement}: {result.stderr.strip()[-500:]}")
+            if installable:
+                result = self._pip(python, *offline, *installable)
+                if result.returncode != 0:
+                    logger.warning(f"Could not install {', '.join(installable)}: {result.stderr.strip()[-500:]}")
+                    return python
+
+        if installable == requirements:
+            with open(os.path.join(environment_path, COMPLETE_MARKER), "w") as f:
+                f.write("".join(f"{requirement}\n" for requirement in requirements))
+        logger.info(f"Environment {key} is ready")
+        return python
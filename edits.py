@@ -0,0 +1,87 @@
+import ast
+import re
+from typing import List, Tuple
+
+EDIT_BLOCK_PATTERN = re.compile(
+    r"^<{5,9} SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} REPLACE[^\n]*$",
+    re.DOTALL | re.MULTILINE,
+)
+
+EDIT_FORMAT_INSTRUCTIONS = """
+        ### **Output Format:**
+        - **Return only the changes, as one or more SEARCH/REPLACE blocks:**
+        <<<<<<< SEARCH
+        exact lines copied from the current file
+        =======
+        the lines that replace them
+        >>>>>>> REPLACE
+        - **Every SEARCH section must match the current file exactly, including indentation, and only once. Include enough surrounding lines to make it unique.**
+        - **Use an empty SEARCH section to append lines to the end of the file.**
+        - **Do not return the whole file and do not add any other text.**
+        """
+
+
+class EditError(ValueError):
+
+    """Raised when edits returned by the model cannot be applied."""
+
+
+def parse_edit_blocks(text: str) -> List[Tuple[str, str]]:
+
+    """Returns the (search, replace) pairs of the SEARCH/REPLACE blocks in a
+    model answer, in order. Each section loses the newline before its
+    closing marker."""
+
+    return [
+        (search[:-1] if search.endswith("\n") else search, replace[:-1] if replace.endswith("\n") else replace)
+        for search, replace in EDIT_BLOCK_PATTERN.findall(text)
+    ]
+
+
+def _replace_once(code: str, search: str, replace: str) -> str:
+
+    """Replaces the single occurrence of search in code. When it does not
+    occur verbatim, lines are compared without trailing whitespace."""
+
+    if not search:
+        return f"{code}\n{replace}" if code else replace
+
+    count = code.count(search)
+    if count == 1:
+        return code.replace(search, replace, 1)
+    if count > 1:
+        raise EditError(f"SEARCH section matches {count} places:\n{search}")
+
+    code_lines = code.split("\n")
+    stripped_lines = [line.rstrip() for line in code_lines]
+    search_lines = [line.rstrip() for line in search.split("\n")]
+    matches = [
+        index for index in range(len(code_lines) - len(search_lines) + 1)
+        if stripped_lines[index:index + len(search_lines)] == search_lines
+    ]
+    if len(matches) != 1:
+        raise EditError(f"SEARCH section matches {len(matches)} places:\n{search}")
+    index = matches[0]
+    return "\n".join(code_lines[:index] + replace.split("\n") + code_lines[index + len(search_lines):])
+
+
+def apply_edits(file_path: str, code: str, blocks: List[Tuple[str, str]]) -> str:
+
+    """
+    Applies SEARCH/REPLACE blocks to a file's code, one after another.
+
+    Raises:
+        EditError: If a SEARCH section does not match exactly one place, or
+            if an edited Python file no longer parses.
+    """
+
+    edited = code
+    for search, replace in blocks:
+        edited = _replace_once(edited, search, replace)
+
+    if file_path.endswith(".py"):
+        try:
+            ast.parse(edited, filename=file_path)
+        except SyntaxError as e:
+            raise EditError(f"The edited file does not parse: {e.msg} (line {e.lineno})")
+    return edited
@@ -0,0 +1,109 @@
+import os
+from typing import IO, Iterator, Union
+from zipfile import BadZipFile
+
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.opc.exceptions import PackageNotFoundError
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from fastapi import UploadFile
+from lxml.etree import XMLSyntaxError
+
+
+class UploadTooLargeError(Exception):
+
+    """Raised when an upload exceeds the configured size limit."""
+
+
+class InvalidDocumentError(Exception):
+
+    """Raised when an upload is not a readable .docx document."""
+
+
+def check_upload_size(file: UploadFile, max_bytes: int) -> None:
+
+    """
+    Rejects an upload larger than max_bytes. Starlette has already spooled
+    the upload, so its size is known without reading it again.
+
+    Raises:
+        UploadTooLargeError: If the upload is larger than max_bytes.
+    """
+
+    size = file.size
+    if size is None:
+        size = file.file.seek(0, os.SEEK_END)
+    file.file.seek(0)
+    if size > max_bytes:
+        raise UploadTooLargeError(f"Upload exceeds the limit of {max_bytes} bytes")
+
+
+def load_docx(source: Union[str, IO[bytes]]) -> DocumentObject:
+
+    """
+    Opens a .docx document from a path or a binary file object.
+
+    Raises:
+        InvalidDocumentError: If source is not a valid .docx package.
+    """
+
+    try:
+        return Document(source)
+    except (PackageNotFoundError, BadZipFile, KeyError, XMLSyntaxError) as e:
+        raise InvalidDocumentError("The upload is not a valid .docx document") from e
+
+
+def _iter_block_text(parent, container) -> Iterator[str]:
+
+    """Yields the text of the paragraphs and tables in a body, header, footer
+    or table cell, in document order."""
+
+    for child in container.iterchildren():
+        if child.tag == qn("w:p"):
+            yield Paragraph(child, parent).text
+        elif child.tag == qn("w:tbl"):
+            yield from _iter_table_text(Table(child, parent))
+
+
+def _iter_table_text(table: Table) -> Iterator[str]:
+
+    """Yields one line per table row with the cells separated by " | ".
+    Tables nested in a cell follow the row they belong to."""
+
+    for row in table.rows:
+        cells = []
+        nested = []
+        seen = set()
+        for cell in row.cells:
+            # Merged cells are returned once per grid column.
+            if id(cell._tc) in seen:
+                continue
+            seen.add(id(cell._tc))
+            cells.append(" ".join(paragraph.text for paragraph in cell.paragraphs).strip())
+            nested.extend(cell.tables)
+        yield " | ".join(cells)
+        for nested_table in nested:
+            yield from _iter_table_text(nested_table)
+
+
+def iter_docx_text(document: DocumentObject) -> Iterator[str]:
+
+    """
+    Lazily yields the text of a .docx document line by line: the headers,
+    then the body paragraphs and tables in document order, then the footers.
+    Headers and footers linked to a previous section are only read once.
+    """
+
+    sections = list(document.sections)
+
+    for section in sections:
+        if not section.header.is_linked_to_previous:
+            yield from _iter_block_text(section.header, section.header._element)
+
+    yield from _iter_block_text(document, document.element.body)
+
+    for section in sections:
+        if not section.footer.is_linked_to_previous:
+            yield from _iter_block_text(section.footer, section.footer._element)
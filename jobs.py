@@ -0,0 +1,208 @@
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class QueueFullError(Exception):
+
+    """Raised when the job queue cannot accept another run."""
+
+
+class Job:
+
+    """A single workflow run for an uploaded SRD document, executed in its
+    own working directory."""
+
+    def __init__(self, job_id: str, working_dir: str):
+        self.id = job_id
+        self.working_dir = working_dir
+        self.srd_path = os.path.join(working_dir, "srd.txt")
+        self.folder_path = os.path.join(working_dir, "generated_project")
+        self.status = "queued"
+        self.resume = False
+        self.current_node: Optional[str] = None
+        self.node_progress: Dict[str, int] = {}
+        self.error: Optional[str] = None
+        self.artifact_path: Optional[str] = None
+        self.created_at = time.time()
+        self.queued_at = self.created_at
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+
+        """Returns the job status as a JSON serialisable dictionary."""
+
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "current_node": self.current_node,
+            "node_progress": dict(self.node_progress),
+            "error": self.error,
+            "artifact_ready": self.artifact_path is not None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+
+    """Runs workflow jobs on a fixed pool of worker threads fed by a bounded
+    queue, so uploads never block the event loop and concurrent runs never
+    share files."""
+
+    def __init__(self, workers: int = 2, queue_size: int = 16, jobs_dir: str = "jobs"):
+        self.jobs_dir = jobs_dir
+        self.jobs: Dict[str, Job] = {}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, srd_lines: Iterable[str]) -> Job:
+
+        """Creates a job for the SRD text, given as lines that are written to
+        the job directory one at a time, and enqueues it.
+
+        Raises:
+            QueueFullError: If the queue already holds queue_size jobs.
+        """
+
+        job_id = uuid.uuid4().hex
+        job = Job(job_id, os.path.join(self.jobs_dir, job_id))
+        os.makedirs(job.working_dir, exist_ok=True)
+        try:
+            with open(job.srd_path, "w") as f:
+                for index, line in enumerate(srd_lines):
+                    f.write(f"\n{line}" if index else line)
+        except BaseException:
+            shutil.rmtree(job.working_dir, ignore_errors=True)
+            raise
+
+        self.jobs[job_id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            del self.jobs[job_id]
+            shutil.rmtree(job.working_dir, ignore_errors=True)
+            raise QueueFullError("Too many jobs are waiting, try again later")
+        return job
+
+    def resume(self, job_id: str) -> Optional[Job]:
+
+        """Enqueues a failed job again so it continues from its last
+        checkpointed node, or from the start when it never wrote a
+        checkpoint. Jobs started by an earlier server process are found
+        through their working directory.
+
+        Raises:
+            QueueFullError: If the queue already holds queue_size jobs.
+            ValueError: If checkpointing is disabled, or the job is queued,
+                running or completed.
+        """
+
+        # Imported here so the server starts without loading LangGraph.
+        import workflow
+
+        if workflow.get_checkpointer() is None:
+            raise ValueError("Jobs cannot be resumed while checkpointing is disabled")
+
+        job = self.jobs.get(job_id)
+        if job is None:
+            working_dir = os.path.join(self.jobs_dir, job_id)
+            if not JOB_ID_PATTERN.fullmatch(job_id) or not os.path.isdir(working_dir):
+                return None
+            job = self.jobs.setdefault(job_id, Job(job_id, working_dir))
+        elif job.status in ("queued", "running", "completed"):
+            raise ValueError(f"Job {job_id} is {job.status}")
+
+        checkpoint = workflow.get_workflow().get_state(workflow.run_config(job_id))
+        if checkpoint.values and not checkpoint.next:
+            # A restored job whose run had already finished.
+            job.status = "completed"
+            job.artifact_path = checkpoint.values.get("artifact_path")
+            raise ValueError(f"Job {job_id} is completed")
+        if not checkpoint.values and not os.path.exists(job.srd_path):
+            raise ValueError(f"Job {job_id} has neither a checkpoint nor an SRD document")
+
+        job.status = "queued"
+        job.resume = bool(checkpoint.values)
+        job.error = None
+        job.queued_at = time.time()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            job.status = "failed"
+            raise QueueFullError("Too many jobs are waiting, try again later")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+
+        """Returns the job with the given id, if any."""
+
+        return self.jobs.get(job_id)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: Job) -> None:
+
+        """Runs the workflow graph for a job, recording every completed node."""
+
+        # Imported here so the server starts without loading LangGraph; the
+        # compiled graph is then shared by every job.
+        import workflow
+
+        job.status = "running"
+        job.started_at = time.time()
+        metrics.record_queue_wait("jobs", job.started_at - job.queued_at, run_id=job.id)
+        try:
+            # The job id is the checkpoint thread id, so a resumed job starts
+            # from the last node its previous attempt completed.
+            initial_state = None
+            if not job.resume:
+                with open(job.srd_path, "r") as f:
+                    initial_state = workflow.create_initial_state(f.read(), job.folder_path)
+
+            for update in workflow.get_workflow().stream(initial_state, config=workflow.run_config(job.id), stream_mode="updates"):
+                for node, values in update.items():
+                    job.current_node = node
+                    job.node_progress[node] = job.node_progress.get(node, 0) + 1
+                    if isinstance(values, dict) and values.get("artifact_path"):
+                        job.artifact_path = values["artifact_path"]
+            if job.artifact_path is None and workflow.get_checkpointer() is not None:
+                # A resumed run that had already packaged its artifact streams
+                # no updates, and a job restored from its working directory
+                # has no artifact_path of its own, so it comes from the checkpoint.
+                checkpoint = workflow.get_workflow().get_state(workflow.run_config(job.id))
+                job.artifact_path = (checkpoint.values or {}).get("artifact_path")
+            job.status = "completed"
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.current_node = None
+            job.finished_at = time.time()
+            workflow.write_run_profile(job.id, job.folder_path)
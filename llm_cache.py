@@ -0,0 +1,143 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import warnings
+from typing import Any, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk
+
+import metrics
+
+# The only classes cached responses are deserialised into.
+CACHED_OBJECTS = [ChatGeneration, ChatGenerationChunk, AIMessage, AIMessageChunk]
+
+# loads is marked beta and would warn on every cache hit.
+warnings.filterwarnings("ignore", message="The function `loads` is in beta", category=DeprecationWarning)
+
+
+class SQLiteLLMCache(BaseCache):
+
+    """An on-disk cache of model responses for use with `cache=` on a chat model.
+
+    Entries are keyed by a SHA-256 hash of the llm string (model name,
+    temperature and the other call parameters) and the prompt. Entries older
+    than max_age_seconds are dropped on lookup, and once the cache holds more
+    than max_entries the least recently used ones are evicted.
+    """
+
+    def __init__(self, database_path: str = ".llm_cache.sqlite", max_entries: int = 5000, max_age_seconds: Optional[float] = None):
+        self.database_path = database_path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at)")
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+
+        """Returns the cached generations for the prompt, or None on a miss."""
+
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_seconds is not None and now - row[1] > self.max_age_seconds:
+                with self._connection:
+                    self._connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                metrics.record_cache_lookup(False)
+                return None
+            with self._connection:
+                self._connection.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        metrics.record_cache_lookup(True)
+        return [loads(generation, allowed_objects=CACHED_OBJECTS) for generation in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+
+        """Stores the generations for the prompt and evicts old entries."""
+
+        key = self._key(prompt, llm_string)
+        response = json.dumps([dumps(generation) for generation in return_val])
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            if self.max_age_seconds is not None:
+                self._connection.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.max_age_seconds,))
+            self._connection.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+
+        """Removes every cached response."""
+
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+
+        """Returns the hit/miss counters and the number of stored entries."""
+
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+def _cache_key(model: Any, prompt: str) -> Optional[tuple]:
+
+    """Returns the cache of a chat model and the prompt and llm string that
+    model.invoke(prompt) is cached under, or None when it has no cache."""
+
+    cache = getattr(model, "cache", None)
+    if not isinstance(cache, BaseCache):
+        return None
+    return cache, dumps([HumanMessage(content=prompt)]), model._get_llm_string()
+
+
+def cached_response(model: Any, prompt: str) -> Optional[str]:
+
+    """Returns the cached answer of model.invoke(prompt), or None. Chat
+    models only consult their cache when invoked, so streamed calls look
+    their answer up here first."""
+
+    key = _cache_key(model, prompt)
+    if key is None:
+        return None
+    cache, cache_prompt, llm_string = key
+    generations = cache.lookup(cache_prompt, llm_string)
+    return generations[0].message.content if generations else None
+
+
+def store_response(model: Any, prompt: str, answer: str) -> None:
+
+    """Caches a streamed answer as the answer of model.invoke(prompt)."""
+
+    key = _cache_key(model, prompt)
+    if key is not None:
+        cache, cache_prompt, llm_string = key
+        cache.update(cache_prompt, llm_string, [ChatGeneration(message=AIMessage(content=answer))])
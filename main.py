@@ -1,12 +1,65 @@
-from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import JSONResponse
-from docx import Document
-import io
+from fastapi import FastAPI, File, Request, UploadFile, Form
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
+import json
+import logging
+import os
 import shutil
 from pathlib import Path
+from typing import IO, Optional
+from artifacts import project_entries, stream_zip
+import metrics
+import progress
+from ingestion import InvalidDocumentError, UploadTooLargeError, check_upload_size, iter_docx_text, load_docx
+from jobs import JobManager, QueueFullError
+ 
+logging.basicConfig(level=logging.INFO)
  
 app = FastAPI()
  
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Allowance for the multipart boundaries and headers around an uploaded file.
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+ 
+job_manager = JobManager(
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    queue_size=int(os.getenv("JOB_QUEUE_SIZE", "16")),
+    jobs_dir=os.getenv("JOBS_DIR", "jobs"),
+)
+ 
+ 
+ 
+def write_docx_text(source: IO[bytes], text_path: str) -> str:
+ 
+    """Writes the text of a .docx document to text_path line by line and
+    returns it.
+ 
+    Raises:
+        InvalidDocumentError: If source is not a valid .docx document.
+    """
+ 
+    document = load_docx(source)
+    lines = []
+    with open(text_path, "w") as f:
+        for index, line in enumerate(iter_docx_text(document)):
+            f.write(f"\n{line}" if index else line)
+            lines.append(line)
+    return "\n".join(lines)
+ 
+ 
+ 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+ 
+    """Rejects a request whose declared body is larger than an upload may
+    be, before the body is received."""
+ 
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+        return JSONResponse(content={"error": f"Upload exceeds the limit of {MAX_UPLOAD_BYTES} bytes"}, status_code=413)
+    return await call_next(request)
+ 
  
  
 @app.get("/")
@@ -22,21 +75,169 @@ async def Working():
 async def upload_docx(file: UploadFile = File(...)):
  
     """
-    Takes a .docx file as input and returns the text from the document.
+    Takes a .docx file as input and returns the text from the document,
+    including its tables, headers and footers.
     Returns:
         str: The text extracted from the .docx document.
     """
  
-    if file.content_type != "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+    if file.content_type != DOCX_CONTENT_TYPE:
+        return JSONResponse(content={"error": "Invalid file type"}, status_code=400)
+    try:
+        check_upload_size(file, MAX_UPLOAD_BYTES)
+        text_content = await asyncio.to_thread(write_docx_text, file.file, "extracted_text.txt")
+    except UploadTooLargeError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=413)
+    except InvalidDocumentError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    return {"content": text_content}
+ 
+ 
+ 
+@app.get("/events/")
+async def stream_events(job_id: Optional[str] = None):
+ 
+    """
+    Streams code generation progress as server-sent events. Every event
+    carries the job_id of its job; pass job_id to receive one job's events.
+    Returns:
+        StreamingResponse: A text/event-stream of the events published by the workflow.
+    """
+ 
+    listener = progress.subscribe(job_id)
+ 
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(listener.queue.get(), 15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            progress.unsubscribe(listener)
+ 
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+ 
+ 
+ 
+@app.post("/jobs")
+async def create_job(file: UploadFile = File(...)):
+ 
+    """
+    Takes a .docx SRD document and enqueues a workflow run for it.
+    Returns:
+        dict: The id and status of the queued job.
+    """
+ 
+    if file.content_type != DOCX_CONTENT_TYPE:
         return JSONResponse(content={"error": "Invalid file type"}, status_code=400)
-    contents = await file.read()
-    document = Document(io.BytesIO(contents))
-    doc_text = []
-    for paragraph in document.paragraphs:
-        doc_text.append(paragraph.text)
-    text_content = "\n".join(doc_text)
-    text = {"content": "\n".join(doc_text)}
-    with open("extracted_text.txt", "w") as f:
-        f.write(text_content)
-    return text
+    try:
+        check_upload_size(file, MAX_UPLOAD_BYTES)
+        # Opened before submitting, so a corrupt document is rejected before
+        # the job directory is created.
+        document = await asyncio.to_thread(load_docx, file.file)
+        job = await asyncio.to_thread(job_manager.submit, iter_docx_text(document))
+    except UploadTooLargeError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=413)
+    except InvalidDocumentError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except QueueFullError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=503)
+    return JSONResponse(content=job.to_dict(), status_code=202)
+ 
+ 
+ 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+ 
+    """
+    Returns the status and per-node progress of a job.
+    """
+ 
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+    return job.to_dict()
+ 
+ 
+ 
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+ 
+    """
+    Enqueues a failed job again; it continues from its last completed node,
+    or from the start when it never completed one.
+    Returns:
+        dict: The id and status of the queued job; 409 when the job is
+        queued, running or completed, or checkpointing is disabled.
+    """
+ 
+    try:
+        job = await asyncio.to_thread(job_manager.resume, job_id)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=409)
+    except QueueFullError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=503)
+    if job is None:
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+    return JSONResponse(content=job.to_dict(), status_code=202)
+ 
+ 
+ 
+@app.get("/jobs/{job_id}/artifact")
+async def get_job_artifact(job_id: str):
+ 
+    """
+    Returns the zipped generated project of a completed job. The archive
+    is streamed while it is built, without environments and caches.
+    Returns:
+        StreamingResponse: The zip archive of the packaged project folder.
+    """
+ 
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+    if job.artifact_path is None or not os.path.isdir(job.artifact_path):
+        return JSONResponse(content={"error": f"Artifact not available, job is {job.status}"}, status_code=409)
+    entries = await asyncio.to_thread(project_entries, job.artifact_path)
+    return StreamingResponse(
+        stream_zip(job.artifact_path, entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{job.id}.zip"'},
+    )
+
+ 
+ 
+ 
+@app.get("/jobs/{job_id}/profile")
+async def get_job_profile(job_id: str):
+ 
+    """
+    Returns the timing and token profile of a finished job.
+    Returns:
+        FileResponse: The profile.json written when the job's run ended.
+    """
+ 
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+    profile_path = os.path.join(job.working_dir, "profile.json")
+    if not os.path.exists(profile_path):
+        return JSONResponse(content={"error": f"Profile not available, job is {job.status}"}, status_code=409)
+    return FileResponse(profile_path, media_type="application/json")
+ 
+ 
+ 
+@app.get("/metrics")
+async def get_metrics():
+ 
+    """
+    Exposes node, model call, queue wait and retry metrics of every run
+    served by this process.
+    Returns:
+        PlainTextResponse: The metrics in the Prometheus text exposition format.
+    """
  
+    return PlainTextResponse(metrics.REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
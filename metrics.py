@@ -0,0 +1,335 @@
+import inspect
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple, get_type_hints
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_core.runnables import RunnableConfig
+
+# Metric name -> (type, help text) of everything render_prometheus exports.
+METRICS = {
+    "workflow_node_duration_seconds": ("summary", "Wall time of workflow node executions."),
+    "workflow_node_errors_total": ("counter", "Workflow node executions that raised."),
+    "workflow_llm_call_duration_seconds": ("summary", "Wall time of model calls, including rate limiter waits."),
+    "workflow_llm_errors_total": ("counter", "Model calls that raised."),
+    "workflow_llm_cache_hits_total": ("counter", "Model calls answered from the response cache."),
+    "workflow_llm_tokens_total": ("counter", "Prompt and completion tokens of model calls."),
+    "workflow_queue_wait_seconds": ("summary", "Time spent waiting for the rate limiter or a job worker."),
+    "workflow_retries_total": ("counter", "Retries of workflow steps by kind."),
+}
+
+# (run id, node) of the node execution the current code runs in.
+_context: ContextVar[Tuple[Optional[str], Optional[str]]] = ContextVar("metrics_context", default=(None, None))
+
+# Set by the response cache on a hit and read when the model call ends,
+# which happens on the same thread.
+_cache_lookup = threading.local()
+
+
+def percentile(values: List[float], q: float) -> float:
+
+    """Returns the q-th percentile (0-100) of values by nearest rank, or 0.0
+    for no values."""
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def _timing_summary(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "total_seconds": round(sum(values), 6),
+        "p50_seconds": round(percentile(values, 50), 6),
+        "p95_seconds": round(percentile(values, 95), 6),
+        "max_seconds": round(max(values, default=0.0), 6),
+    }
+
+
+class RunProfile:
+
+    """Timings, tokens, retries and cache hits of a single workflow run."""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.started_at = time.time()
+        self.finished_at = self.started_at
+        self.node_durations: Dict[str, List[float]] = defaultdict(list)
+        self.node_errors: Dict[str, int] = defaultdict(int)
+        self.llm_calls: Dict[str, List[dict]] = defaultdict(list)
+        self.queue_waits: Dict[str, List[float]] = defaultdict(list)
+        self.retries: Dict[str, int] = defaultdict(int)
+
+    def to_dict(self) -> dict:
+
+        """Returns the profile as a JSON serialisable dictionary with
+        per-node and per-node model call summaries."""
+
+        llm = {}
+        for node, calls in self.llm_calls.items():
+            llm[node] = {
+                **_timing_summary([call["seconds"] for call in calls]),
+                "errors": sum(call["error"] for call in calls),
+                "cache_hits": sum(call["cached"] for call in calls),
+                "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+                "completion_tokens": sum(call["completion_tokens"] for call in calls),
+            }
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wall_time_seconds": round(self.finished_at - self.started_at, 6),
+            "nodes": {
+                node: {**_timing_summary(durations), "errors": self.node_errors.get(node, 0)}
+                for node, durations in self.node_durations.items()
+            },
+            "llm_calls": llm,
+            "queue_waits": {queue: _timing_summary(waits) for queue, waits in self.queue_waits.items()},
+            "retries": dict(self.retries),
+        }
+
+
+class Registry:
+
+    """Process-wide counters and summaries, plus the profile of every run
+    that has not been written yet. All methods are thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, tuple], float] = defaultdict(float)
+        self._summaries: Dict[Tuple[str, tuple], List[float]] = defaultdict(lambda: [0, 0.0])
+        self._profiles: Dict[str, RunProfile] = {}
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            summary = self._summaries[(name, tuple(sorted(labels.items())))]
+            summary[0] += 1
+            summary[1] += value
+
+    def update_profile(self, run_id: Optional[str], update: Callable[[RunProfile], None]) -> None:
+
+        """Applies update to the profile of a run, creating it on first use.
+        Code running outside of a run has no profile."""
+
+        if run_id is None:
+            return
+        with self._lock:
+            profile = self._profiles.setdefault(run_id, RunProfile(run_id))
+            update(profile)
+            profile.finished_at = time.time()
+
+    def pop_profile(self, run_id: str) -> Optional[dict]:
+
+        """Removes the profile of a run and returns it as a dictionary."""
+
+        with self._lock:
+            profile = self._profiles.pop(run_id, None)
+        return profile.to_dict() if profile else None
+
+    def render_prometheus(self) -> str:
+
+        """Returns every metric in the Prometheus text exposition format."""
+
+        with self._lock:
+            counters = dict(self._counters)
+            summaries = {key: list(value) for key, value in self._summaries.items()}
+
+        lines = []
+        for name, (metric_type, description) in METRICS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            else:
+                for (metric, labels), (count, total) in sorted(summaries.items()):
+                    if metric == name:
+                        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+                        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+REGISTRY = Registry()
+
+
+def record_node(run_id: Optional[str], node: str, seconds: float, error: bool = False) -> None:
+    REGISTRY.observe("workflow_node_duration_seconds", seconds, node=node)
+    if error:
+        REGISTRY.increment("workflow_node_errors_total", node=node)
+
+    def update(profile: RunProfile) -> None:
+        profile.node_durations[node].append(seconds)
+        if error:
+            profile.node_errors[node] += 1
+
+    REGISTRY.update_profile(run_id, update)
+
+
+def record_llm_call(seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0, cached: bool = False, error: bool = False) -> None:
+
+    """Records a model call made by the current node."""
+
+    run_id, node = _context.get()
+    node = node or "none"
+    REGISTRY.observe("workflow_llm_call_duration_seconds", seconds, node=node)
+    REGISTRY.increment("workflow_llm_tokens_total", prompt_tokens, node=node, type="prompt")
+    REGISTRY.increment("workflow_llm_tokens_total", completion_tokens, node=node, type="completion")
+    if cached:
+        REGISTRY.increment("workflow_llm_cache_hits_total", node=node)
+    if error:
+        REGISTRY.increment("workflow_llm_errors_total", node=node)
+
+    call = {"seconds": seconds, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cached": cached, "error": error}
+    REGISTRY.update_profile(run_id, lambda profile: profile.llm_calls[node].append(call))
+
+
+def record_queue_wait(queue: str, seconds: float, run_id: Optional[str] = None) -> None:
+
+    """Records time spent waiting in a queue, attributed to run_id or to
+    the run the calling code belongs to."""
+
+    run_id = run_id or _context.get()[0]
+    REGISTRY.observe("workflow_queue_wait_seconds", seconds, queue=queue)
+    REGISTRY.update_profile(run_id, lambda profile: profile.queue_waits[queue].append(seconds))
+
+
+def record_retry(kind: str) -> None:
+
+    """Records a retry of a workflow step, e.g. another repair pass."""
+
+    run_id = _context.get()[0]
+    REGISTRY.increment("workflow_retries_total", kind=kind)
+
+    def update(profile: RunProfile) -> None:
+        profile.retries[kind] += 1
+
+    REGISTRY.update_profile(run_id, update)
+
+
+def current_run_id() -> Optional[str]:
+
+    """Returns the id of the run the calling code belongs to, if any."""
+
+    return _context.get()[0]
+
+
+def record_cache_lookup(hit: bool) -> None:
+
+    """Called by the response cache so the model call it belongs to is
+    recorded as a cache hit."""
+
+    _cache_lookup.hit = hit
+
+
+def write_profile(run_id: str, path: str) -> Optional[dict]:
+
+    """Writes the profile of a run as JSON to path and stops tracking the
+    run. Returns the profile, or None when nothing was recorded for it."""
+
+    profile = REGISTRY.pop_profile(run_id)
+    if profile is not None:
+        with open(path, "w") as f:
+            json.dump(profile, f, indent=2)
+    return profile
+
+
+def instrument_node(name: str, func: Callable) -> Callable:
+
+    """Wraps a graph node so every execution is timed and the model calls it
+    makes are attributed to it and to its run, given by the thread id."""
+
+    def node(state, config: RunnableConfig):
+        run_id = (config.get("configurable") or {}).get("thread_id")
+        token = _context.set((run_id, name))
+        start = time.perf_counter()
+        error = False
+        try:
+            return func(state)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            record_node(run_id, name, time.perf_counter() - start, error)
+            _context.reset(token)
+
+    # Keep the input type of the wrapped node, e.g. the payload of a Send
+    # branch, for LangGraph's schema inference.
+    first_parameter = next(iter(inspect.signature(func).parameters))
+    input_hint = get_type_hints(func).get(first_parameter)
+    if input_hint is not None:
+        node.__annotations__ = {"state": input_hint, "config": RunnableConfig}
+    node.__name__ = name
+    node.__qualname__ = name
+    return node
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+
+    """Records the wall time, token usage and cache hits of every chat model
+    call made with it in the invoke config."""
+
+    def __init__(self):
+        self._started: Dict[object, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        _cache_lookup.hit = False
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        seconds = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = token_usage.get("prompt_tokens", 0)
+            completion_tokens = token_usage.get("completion_tokens", 0)
+        # Cached responses carry the usage of the original call but cost nothing.
+        if getattr(_cache_lookup, "hit", False):
+            record_llm_call(seconds, cached=True)
+        else:
+            record_llm_call(seconds, prompt_tokens, completion_tokens)
+        _cache_lookup.hit = False
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        seconds = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+        record_llm_call(seconds, error=True)
+
+
+class TimedRateLimiter(InMemoryRateLimiter):
+
+    """InMemoryRateLimiter that records how long every request waited for
+    a token."""
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        start = time.perf_counter()
+        acquired = super().acquire(blocking=blocking)
+        record_queue_wait("rate_limiter", time.perf_counter() - start)
+        return acquired
+
+
+CALLBACK_HANDLER = MetricsCallbackHandler()
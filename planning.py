@@ -0,0 +1,239 @@
+import json
+import posixpath
+import re
+from typing import Any, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+
+FENCED_BLOCK_PATTERN = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+MISSING_DESCRIPTION = "No description available"
+
+
+def normalise_path(file_path: str) -> str:
+    return posixpath.normpath(file_path.strip().replace("\\", "/"))
+
+
+def stringify_descriptions(descriptions: Any) -> Any:
+
+    """Keeps descriptions given as objects, e.g. the classes and methods of
+    a file, as their JSON text."""
+
+    if not isinstance(descriptions, dict):
+        return descriptions
+    return {path: text if isinstance(text, str) else json.dumps(text) for path, text in descriptions.items()}
+
+
+class PlanParseError(ValueError):
+
+    """Raised when a model response does not contain a valid project plan.
+    recovered holds the plan recovered from the complete part of a response
+    that was cut off, which may be missing files."""
+
+    def __init__(self, message: str, recovered: Optional["ProjectPlan"] = None):
+        super().__init__(message)
+        self.recovered = recovered
+
+
+class ProjectPlan(BaseModel):
+
+    """The file structure of a generated project and a description of
+    every file."""
+
+    files: List[str] = Field(min_length=1)
+    descriptions: Dict[str, str] = Field(default_factory=dict)
+
+    @field_validator("descriptions", mode="before")
+    @classmethod
+    def stringify_descriptions(cls, descriptions: Any) -> Any:
+        return stringify_descriptions(descriptions)
+
+    @field_validator("files")
+    @classmethod
+    def check_paths(cls, files: List[str]) -> List[str]:
+
+        """Normalises the paths and rejects paths outside the project. The
+        prompt asks for file and folder paths, so folders, given with a
+        trailing slash or as the parent of another path, are dropped."""
+
+        paths = []
+        for file_path in files:
+            if file_path.strip().replace("\\", "/").endswith("/"):
+                continue
+            path = normalise_path(file_path)
+            if not path or path == "." or path.startswith(("/", "../")) or path == "..":
+                raise ValueError(f"{file_path!r} is not a relative path inside the project")
+            if path not in paths:
+                paths.append(path)
+        paths = [path for path in paths if not any(other.startswith(path + "/") for other in paths)]
+        if not paths:
+            raise ValueError("The plan lists no files")
+        return paths
+
+    @model_validator(mode="after")
+    def match_descriptions(self) -> "ProjectPlan":
+
+        """Keys the descriptions by the normalised paths; planned files
+        without one get a placeholder and descriptions of unplanned files
+        are dropped."""
+
+        descriptions = {normalise_path(path): text for path, text in self.descriptions.items()}
+        self.descriptions = {path: descriptions.get(path, MISSING_DESCRIPTION) for path in self.files}
+        return self
+
+
+class PlanContinuation(BaseModel):
+
+    """The rest of a plan that was cut off: the files missing from it and
+    the descriptions it lacks. It is empty when nothing was missing."""
+
+    files: List[str] = Field(default_factory=list)
+    descriptions: Dict[str, str] = Field(default_factory=dict)
+
+    @field_validator("descriptions", mode="before")
+    @classmethod
+    def stringify_descriptions(cls, descriptions: Any) -> Any:
+        return stringify_descriptions(descriptions)
+
+
+def _close_truncated(text: str) -> Optional[str]:
+
+    """Turns a JSON document cut off mid-way into a valid one by dropping
+    the incomplete last member and closing every open string, array and
+    object. Returns None when text is not truncated."""
+
+    stack = []
+    in_string = False
+    escaped = False
+    last_complete = None
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if stack:
+                stack.pop()
+        elif char == "," and stack:
+            last_complete = (index, list(stack))
+
+    if not stack:
+        return None
+    if last_complete is None:
+        return text + ('"' if in_string else "") + "".join(reversed(stack))
+    index, open_brackets = last_complete
+    return text[:index] + "".join(reversed(open_brackets))
+
+
+def _candidates(text: str) -> List[str]:
+
+    """Returns the substrings of a response that may hold the plan: the
+    whole response, fenced code blocks and the outermost braces."""
+
+    candidates = [text.strip()]
+    candidates.extend(block.strip() for block in FENCED_BLOCK_PATTERN.findall(text))
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end > start:
+        candidates.append(text[start:end + 1])
+    return list(dict.fromkeys(candidate for candidate in candidates if candidate))
+
+
+def parse_plan(text: str, schema: Type[BaseModel] = ProjectPlan) -> Union[ProjectPlan, PlanContinuation]:
+
+    """
+    Extracts and validates the project plan in a model response, or a
+    PlanContinuation when that is the schema.
+
+    The whole response is tried first, then fenced code blocks and the
+    outermost braces, each decoded and validated in a single pass.
+
+    Raises:
+        PlanParseError: If no valid plan could be extracted; the message
+            holds the error of the last candidate. When the response was cut
+            off, the plan of its complete part is attached as recovered.
+    """
+
+    error = None
+    for candidate in _candidates(text):
+        try:
+            return schema.model_validate_json(candidate)
+        except ValidationError as e:
+            error = e
+
+    start = text.find("{")
+    recovered = _close_truncated(text[start:]) if start != -1 else None
+    if recovered is not None:
+        try:
+            plan = schema.model_validate_json(recovered)
+        except ValidationError:
+            pass
+        else:
+            raise PlanParseError(f"The JSON document is cut off after {len(plan.files)} complete files", recovered=plan)
+
+    raise PlanParseError(str(error) if error else "The response is empty")
+
+
+def fix_json_prompt(text: str, error: str) -> str:
+
+    """Returns the prompt asking the model to correct an invalid plan,
+    without the srd document."""
+
+    return f"""
+    The following JSON project plan is invalid:
+    {text}
+
+    Validation error:
+    {error}
+
+    - Return the corrected JSON object with 'files' (a list of relative file paths) and 'descriptions' (an object mapping each file path to its description).
+    - Keep all paths and descriptions that are already present.
+    - Return only the JSON object without any additional text, markdown, or code blocks.
+    """
+
+
+def continue_plan_prompt(prompt: str, plan: ProjectPlan) -> str:
+
+    """Returns the planning prompt asking only for the part of a plan that
+    was cut off: its missing files and the descriptions it lacks."""
+
+    described = [path for path in plan.files if plan.descriptions.get(path) != MISSING_DESCRIPTION]
+    undescribed = [path for path in plan.files if plan.descriptions.get(path) == MISSING_DESCRIPTION]
+    listing = "".join(f"    - {path}\n" for path in described) or "    (none)\n"
+    missing = "".join(f"    - {path}\n" for path in undescribed) or "    (none)\n"
+    return f"""{prompt}
+    Your previous answer was cut off. These files are already planned and described:
+{listing}
+    These files are planned but not described yet:
+{missing}
+    - Return a JSON object with 'files' and 'descriptions' for the files that are still missing and for the files above that are not described yet.
+    - Do not repeat the files that are already described.
+    - If nothing is missing, return {{"files": [], "descriptions": {{}}}}.
+    - Return only the JSON object without any additional text, markdown, or code blocks.
+    """
+
+
+def merge_plans(plan: ProjectPlan, continuation: Union[ProjectPlan, PlanContinuation]) -> ProjectPlan:
+
+    """
+    Adds the files and descriptions of a continuation to a plan that was
+    cut off. Descriptions the plan already has are kept.
+
+    Raises:
+        PlanParseError: If the merged plan is invalid.
+    """
+
+    descriptions = {path: text for path, text in plan.descriptions.items() if text != MISSING_DESCRIPTION}
+    for path, text in continuation.descriptions.items():
+        if text != MISSING_DESCRIPTION:
+            descriptions.setdefault(normalise_path(path), text)
+    try:
+        return ProjectPlan.model_validate({"files": plan.files + continuation.files, "descriptions": descriptions})
+    except ValidationError as e:
+        raise PlanParseError(str(e))
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from typing import Optional
+
+import metrics
+
+_subscribers = []
+_lock = threading.Lock()
+
+
+class Listener:
+
+    """The asyncio queue of one subscriber, bound to the event loop it was
+    created on, and the run whose events it receives (all runs for None)."""
+
+    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop, run_id: Optional[str]):
+        self.queue = queue
+        self.loop = loop
+        self.run_id = run_id
+
+
+def subscribe(run_id: Optional[str] = None, maxsize: int = 1000) -> Listener:
+
+    """Registers a new listener and returns it; its events arrive on
+    listener.queue. Must be called from the event loop that reads them."""
+
+    listener = Listener(asyncio.Queue(maxsize=maxsize), asyncio.get_running_loop(), run_id)
+    with _lock:
+        _subscribers.append(listener)
+    return listener
+
+
+def unsubscribe(listener: Listener) -> None:
+
+    """Stops delivering events to a listener returned by subscribe."""
+
+    with _lock:
+        if listener in _subscribers:
+            _subscribers.remove(listener)
+
+
+def _deliver(queue: asyncio.Queue, event: dict) -> None:
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+def publish(event: dict) -> None:
+
+    """Sends an event, tagged with the job_id (the thread id) of the run it
+    belongs to, to every listener of that run. Safe to call from any thread; listeners that fall behind
+    drop events instead of blocking the workflow."""
+
+    event = {**event, "job_id": metrics.current_run_id()}
+    with _lock:
+        listeners = list(_subscribers)
+    for listener in listeners:
+        if listener.run_id is not None and listener.run_id != event["job_id"]:
+            continue
+        try:
+            listener.loop.call_soon_threadsafe(_deliver, listener.queue, event)
+        except RuntimeError:
+            # The listener's event loop is closed.
+            unsubscribe(listener)
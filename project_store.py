@@ -0,0 +1,58 @@
+import hashlib
+import os
+import tempfile
+from typing import Dict, Iterable
+
+
+def content_hash(code: str) -> str:
+
+    """Returns the SHA-256 hex digest of a file's content."""
+
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def write_atomically(full_path: str, chunks: Iterable[bytes]) -> None:
+
+    """Writes chunks to a temporary file next to full_path and renames it
+    into place, so full_path never holds a partially written file. The
+    temporary file is removed when any step fails."""
+
+    directory = os.path.dirname(full_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        # Temporary files are only readable by their owner.
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, full_path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def flush_project(folder_path: str, project_files: Dict[str, str], flushed: Dict[str, str]) -> Dict[str, str]:
+
+    """
+    Writes the files of the in-memory project store whose content changed
+    since they were last flushed, each one atomically.
+
+    Args:
+        folder_path (str): Root folder of the project on disk.
+        project_files (Dict[str, str]): Content keyed by project file path.
+        flushed (Dict[str, str]): Content hash of every file as last written.
+
+    Returns:
+        Dict[str, str]: Content hashes of the files written by this flush.
+    """
+
+    written = {}
+    for file_path, content in project_files.items():
+        file_hash = content_hash(content)
+        if flushed.get(file_path) == file_hash:
+            continue
+        write_atomically(os.path.join(folder_path, file_path), [content.encode("utf-8")])
+        written[file_path] = file_hash
+    return written
+
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from static_checks import module_name
+
+# Executed with `python -c` in the child process: applies the memory limit
+# before any generated code runs, then runs or imports the module by its dotted
+# name from the project root, so package-relative imports resolve. Absolute
+# imports are looked up in the project root first, then in the module's own
+# directory, as validate_sources does.
+_BOOTSTRAP = """
+import importlib, os, runpy, sys
+mode, name, path, memory_limit = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+if memory_limit:
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    except (ImportError, ValueError, OSError):
+        pass
+sys.argv = [path]
+sys.path[:1] = [os.getcwd(), os.path.dirname(path)]
+if mode == "run" and os.path.basename(path) != "__init__.py":
+    runpy.run_module(name, run_name="__main__", alter_sys=True)
+else:
+    importlib.import_module(name)
+"""
+
+RUN_MODES = ("run", "import", "compile")
+
+
+def check_module(full_path: str, cwd: str, mode: str = "import", timeout: float = 30, memory_limit_mb: int = 1024, python: Optional[str] = None) -> Optional[str]:
+
+    """
+    Checks a single module and returns its error output, or None when it succeeded.
+
+    Args:
+        full_path (str): Path to the module.
+        cwd (str): Working directory of the child process, the project root that
+            full_path is imported from.
+        mode (str): "run" executes the module as __main__, "import" only executes
+            its top level without the __main__ block, and "compile" only compiles
+            it in-process without starting an interpreter.
+        timeout (float): Wall-clock limit in seconds.
+        memory_limit_mb (int): Address space limit of the child process, 0 for none.
+        python (Optional[str]): Interpreter to use, defaults to the current one.
+    """
+
+    if mode not in RUN_MODES:
+        raise ValueError(f"Unknown run mode: {mode}")
+
+    if mode == "compile":
+        try:
+            with open(full_path, "r") as f:
+                compile(f.read(), full_path, "exec")
+        except (SyntaxError, ValueError) as e:
+            return f"{type(e).__name__}: {e}"
+        return None
+
+    name = module_name(os.path.relpath(full_path, cwd))
+    command = [python or sys.executable, "-c", _BOOTSTRAP, mode, name, os.path.abspath(full_path), str(memory_limit_mb * 1024 * 1024)]
+    try:
+        result = subprocess.run(command, cwd=cwd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return f"TimeoutError: {full_path} did not finish within {timeout} seconds"
+    except OSError as e:
+        return str(e)
+
+    if result.returncode != 0:
+        return result.stderr.strip() or f"Exited with status {result.returncode}"
+    return None
+
+
+def check_modules(folder_path: str, file_paths: List[str], mode: str = "import", timeout: float = 30, memory_limit_mb: int = 1024, max_workers: int = 8, python: Optional[str] = None) -> Dict[str, str]:
+
+    """
+    Checks the given project files concurrently, each in its own child process.
+
+    Returns:
+        Dict[str, str]: Error output keyed by the file path of every failing module.
+    """
+
+    def check(file_path: str) -> Optional[str]:
+        return check_module(os.path.join(folder_path, file_path), folder_path, mode, timeout, memory_limit_mb, python)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(check, file_paths)
+        return {file_path: error for file_path, error in zip(file_paths, results) if error}
@@ -0,0 +1,254 @@
+import ast
+import os
+from typing import Dict, List, Optional, Set
+
+
+def module_name(file_path: str) -> str:
+
+    """Returns the dotted module name of a project file, e.g.
+    "app/api/routes.py" -> "app.api.routes" and "app/__init__.py" -> "app"."""
+
+    parts = os.path.normpath(file_path)[:-len(".py")].split(os.sep)
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def project_modules(file_structure: List[str]) -> Dict[str, Optional[str]]:
+
+    """Maps every module and package of the project to its file path.
+    Packages without an __init__.py map to None."""
+
+    modules: Dict[str, Optional[str]] = {}
+    for file_path in file_structure:
+        if not file_path.endswith(".py"):
+            continue
+        name = module_name(file_path)
+        parts = name.split(".")
+        for index in range(1, len(parts)):
+            modules.setdefault(".".join(parts[:index]), None)
+        if name:
+            modules[name] = file_path
+    return modules
+
+
+def defined_names(tree: ast.Module) -> Optional[Set[str]]:
+
+    """Returns the names a module defines at top level, or None when they
+    cannot be known statically (star imports or a module __getattr__)."""
+
+    names: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if node.name == "__getattr__" and node in tree.body:
+                return None
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == "*":
+                    return None
+                names.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+    return names
+
+
+def _resolve(name: str, package: str, modules: Dict[str, Optional[str]]) -> Optional[str]:
+
+    """Resolves an absolute import the way the sandbox does: from the project
+    root first, then from the importing file's own directory."""
+
+    candidates = [name, f"{package}.{name}"] if package else [name]
+    for candidate in candidates:
+        if candidate in modules:
+            return candidate
+    return None
+
+
+def _relative_target(package: str, level: int, module: Optional[str]) -> str:
+
+    """Returns the absolute module name of a relative import."""
+
+    base = package.split(".") if package else []
+    base = base[:len(base) - (level - 1)] if level > 1 else base
+    return ".".join(base + ([module] if module else []))
+
+
+def _package_of(file_path: str) -> str:
+    own_module = module_name(file_path)
+    return own_module if file_path.endswith("__init__.py") else own_module.rpartition(".")[0]
+
+
+def imported_files(file_path: str, source: str, file_structure: List[str]) -> List[str]:
+
+    """Returns the project files a module imports, including submodules
+    imported with `from package import module`. Files that do not parse
+    import nothing."""
+
+    try:
+        tree = ast.parse(source, filename=file_path)
+    except SyntaxError:
+        return []
+
+    modules = project_modules(file_structure)
+    package = _package_of(file_path)
+    targets = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            targets.extend(_resolve(alias.name, package, modules) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                target = _relative_target(package, node.level, node.module)
+            else:
+                target = _resolve(node.module, package, modules)
+            if target is None:
+                continue
+            targets.append(target)
+            targets.extend(f"{target}.{alias.name}" if target else alias.name for alias in node.names)
+
+    files = []
+    for target in targets:
+        imported = modules.get(target) if target else None
+        if imported and imported != file_path and imported not in files:
+            files.append(imported)
+    return files
+
+
+def imported_names(file_path: str, source: str, file_structure: List[str]) -> Dict[str, List[str]]:
+
+    """Returns the names a module imports with `from module import name`,
+    keyed by the project file they are imported from. Submodules imported
+    this way and star imports are left out. Files that do not parse import
+    nothing."""
+
+    try:
+        tree = ast.parse(source, filename=file_path)
+    except SyntaxError:
+        return {}
+
+    modules = project_modules(file_structure)
+    package = _package_of(file_path)
+    names: Dict[str, List[str]] = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ImportFrom):
+            continue
+        target = _relative_target(package, node.level, node.module) if node.level else _resolve(node.module, package, modules)
+        imported = modules.get(target) if target else None
+        if not imported or imported == file_path:
+            continue
+        for alias in node.names:
+            submodule = f"{target}.{alias.name}"
+            if alias.name != "*" and submodule not in modules and alias.name not in names.setdefault(imported, []):
+                names[imported].append(alias.name)
+    return {imported: found for imported, found in names.items() if found}
+
+
+def external_imports(file_path: str, source: str, file_structure: List[str]) -> List[str]:
+
+    """Returns the top-level names of the absolute imports of a module that
+    are not project modules, e.g. "fastapi" for `from fastapi import
+    FastAPI`. Files that do not parse import nothing."""
+
+    try:
+        tree = ast.parse(source, filename=file_path)
+    except SyntaxError:
+        return []
+
+    modules = project_modules(file_structure)
+    package = _package_of(file_path)
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imported = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+            imported = [node.module]
+        else:
+            continue
+        for name in imported:
+            top_level = name.split(".")[0]
+            if _resolve(name, package, modules) is None and top_level not in modules and top_level not in names:
+                names.append(top_level)
+    return names
+
+
+def validate_sources(sources: Dict[str, str]) -> Dict[str, str]:
+
+    """
+    Statically checks the Python files of a project without running them.
+
+    Every file is parsed with ast; syntax errors, imports of project modules
+    that do not exist and names imported from project modules that do not
+    define them are reported. Imports of anything outside the project are
+    left to the interpreter.
+
+    Args:
+        sources (Dict[str, str]): Source code keyed by project file path.
+
+    Returns:
+        Dict[str, str]: Error messages keyed by the file path of every broken file.
+    """
+
+    errors: Dict[str, str] = {}
+    modules = project_modules(list(sources))
+    top_level = {name.split(".")[0] for name in modules}
+    trees: Dict[str, ast.Module] = {}
+
+    for file_path, source in sources.items():
+        if not file_path.endswith(".py"):
+            continue
+        try:
+            trees[file_path] = ast.parse(source, filename=file_path)
+        except SyntaxError as e:
+            errors[file_path] = f"SyntaxError: {e.msg} (line {e.lineno})\n{(e.text or '').rstrip()}"
+
+    names_cache: Dict[str, Optional[Set[str]]] = {}
+
+    def names_of(module: str) -> Optional[Set[str]]:
+        file_path = modules.get(module)
+        if file_path is None:
+            return set()
+        if file_path not in trees:
+            return None
+        if file_path not in names_cache:
+            names_cache[file_path] = defined_names(trees[file_path])
+        return names_cache[file_path]
+
+    for file_path, tree in trees.items():
+        package = _package_of(file_path)
+        sibling_names = {name[len(package) + 1:].split(".")[0] for name in modules if package and name.startswith(package + ".")}
+        problems = []
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.name.split(".")[0] in top_level | sibling_names and _resolve(alias.name, package, modules) is None:
+                        problems.append(f"line {node.lineno}: No module named '{alias.name}' in the project")
+                continue
+            if not isinstance(node, ast.ImportFrom):
+                continue
+
+            if node.level:
+                target = _relative_target(package, node.level, node.module)
+                if target and target not in modules:
+                    problems.append(f"line {node.lineno}: No module named '{target}' in the project")
+                    continue
+            else:
+                if node.module.split(".")[0] not in top_level | sibling_names:
+                    continue
+                target = _resolve(node.module, package, modules)
+                if target is None:
+                    problems.append(f"line {node.lineno}: No module named '{node.module}' in the project")
+                    continue
+
+            available = names_of(target) if target else None
+            if available is None:
+                continue
+            for alias in node.names:
+                submodule = f"{target}.{alias.name}" if target else alias.name
+                if alias.name != "*" and alias.name not in available and submodule not in modules:
+                    problems.append(f"line {node.lineno}: cannot import name '{alias.name}' from '{target}'")
+
+        if problems:
+            errors[file_path] = "ImportError:\n" + "\n".join(problems)
+
+    return errors
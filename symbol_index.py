@@ -0,0 +1,169 @@
+import ast
+import os
+import re
+from typing import Dict, List
+
+from static_checks import module_name
+
+# Phrases that say a description defines a class, e.g. "Classes: User",
+# "the User class" or "defines Base".
+DEFINED_CLASS_PATTERNS = [
+    re.compile(r"\b[Cc]lass(?:es)?\s*:?\s+([A-Z]\w*)"),
+    re.compile(r"\b([A-Z]\w*)\s+class\b"),
+    re.compile(r"\b[Dd]efin\w*\s+(?:the\s+|a\s+|an\s+)?([A-Z]\w*)"),
+]
+FUNCTION_NAME_PATTERN = re.compile(r"\b([a-z][a-z0-9]*(?:_[a-z0-9]+)+)\s*\(")
+WORD_PATTERN = re.compile(r"\w+(?:[./]\w+)*")
+
+# Framework names that descriptions mention without them being project classes.
+EXTERNAL_CLASS_NAMES = {"FastAPI", "APIRouter", "BaseModel", "BaseSettings", "HTTPException", "JSONResponse", "SQLAlchemy", "DeclarativeBase", "TestClient"}
+
+# Module stems that are mentioned in almost every description without
+# meaning a dependency.
+GENERIC_STEMS = {"__init__", "main", "app", "tests"}
+
+
+def defined_class_names(description: str) -> set:
+
+    """Returns the class names a file description says the file defines."""
+
+    names = set()
+    for pattern in DEFINED_CLASS_PATTERNS:
+        names.update(pattern.findall(description))
+    return names - EXTERNAL_CLASS_NAMES
+
+
+def build_symbol_index(file_structure: List[str], file_descriptions: Dict[str, str]) -> Dict[str, dict]:
+
+    """
+    Builds the project symbol index from the planned file descriptions,
+    before any code exists.
+
+    Every Python file gets an entry with its module name, the classes its
+    description says it defines and the functions it mentions. Entries are marked "planned"
+    until symbol_entry replaces them with the real definitions.
+    """
+
+    index = {}
+    for file_path in file_structure:
+        if not file_path.endswith(".py"):
+            continue
+        description = file_descriptions.get(file_path, "")
+        index[file_path] = {
+            "module": module_name(file_path),
+            "status": "planned",
+            "classes": sorted(defined_class_names(description)),
+            "functions": sorted(set(FUNCTION_NAME_PATTERN.findall(description))),
+            "names": [],
+        }
+    return index
+
+
+def _signature(node) -> str:
+    arguments = [argument.arg for argument in node.args.posonlyargs + node.args.args]
+    if node.args.vararg:
+        arguments.append(f"*{node.args.vararg.arg}")
+    arguments.extend(argument.arg for argument in node.args.kwonlyargs)
+    if node.args.kwarg:
+        arguments.append(f"**{node.args.kwarg.arg}")
+    return f"{node.name}({', '.join(arguments)})"
+
+
+def symbol_entry(file_path: str, code: str) -> dict:
+
+    """Returns the symbol index entry of a generated file from its AST.
+    Files that do not parse keep only their module name."""
+
+    entry = {"module": module_name(file_path), "status": "generated", "classes": [], "functions": [], "names": []}
+    try:
+        tree = ast.parse(code, filename=file_path)
+    except SyntaxError:
+        return entry
+
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            methods = [
+                _signature(child) for child in node.body
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and not child.name.startswith("_")
+            ]
+            entry["classes"].append(f"{node.name}: {', '.join(methods)}" if methods else node.name)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            entry["functions"].append(_signature(node))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            entry["names"].extend(target.id for target in targets if isinstance(target, ast.Name))
+    return entry
+
+
+def infer_dependencies(file_structure: List[str], file_descriptions: Dict[str, str]) -> Dict[str, List[str]]:
+
+    """
+    Infers which project files each Python file depends on from the
+    descriptions: a file depends on every other Python file whose path,
+    module name or module stem its description mentions, or whose
+    description defines a class it mentions.
+    """
+
+    python_files = [file_path for file_path in file_structure if file_path.endswith(".py")]
+    defined_classes = {file_path: defined_class_names(file_descriptions.get(file_path, "")) for file_path in python_files}
+
+    dependencies = {}
+    for file_path in python_files:
+        description = file_descriptions.get(file_path, "")
+        words = set(WORD_PATTERN.findall(description))
+        found = []
+        for other in python_files:
+            if other == file_path:
+                continue
+            stem = os.path.splitext(os.path.basename(other))[0]
+            mentions = {other, module_name(other)}
+            if stem not in GENERIC_STEMS:
+                mentions.add(stem)
+            if mentions & words or (defined_classes[other] - defined_classes[file_path]) & words:
+                found.append(other)
+        dependencies[file_path] = found
+    return dependencies
+
+
+def generation_waves(file_structure: List[str], dependencies: Dict[str, List[str]]) -> List[List[str]]:
+
+    """
+    Splits the files into topological waves: every file comes in a later
+    wave than all of its dependencies, so the files of one wave can be
+    generated concurrently. When the remaining files only form dependency
+    cycles, the first of them in planned order is moved to the next wave to
+    break the cycle.
+    """
+
+    remaining = list(file_structure)
+    waves = []
+    while remaining:
+        pending = set(remaining)
+        wave = [
+            file_path for file_path in remaining
+            if not any(dependency in pending for dependency in dependencies.get(file_path, []))
+        ]
+        if not wave:
+            wave = [remaining[0]]
+        waves.append(wave)
+        remaining = [file_path for file_path in remaining if file_path not in wave]
+    return waves
+
+
+def symbol_context(index: Dict[str, dict], file_paths: List[str]) -> str:
+
+    """Formats the index entries of the given files for a prompt."""
+
+    lines = []
+    for file_path in file_paths:
+        entry = index.get(file_path)
+        if entry is None:
+            continue
+        lines.append(f"- {file_path} (import as {entry['module']}, {entry['status']}):")
+        if entry["classes"]:
+            lines.append(f"    classes: {'; '.join(entry['classes'])}")
+        if entry["functions"]:
+            lines.append(f"    functions: {', '.join(entry['functions'])}")
+        if entry["names"]:
+            lines.append(f"    variables: {', '.join(entry['names'])}")
+    return "\n".join(lines) or "None"
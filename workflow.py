@@ -1,62 +1,450 @@
-import os
-import subprocess
+import argparse
+import ast
+import hashlib
 import json
-import re
-from typing import TypedDict, Optional, List, Dict
-from langchain_groq import ChatGroq
-from langgraph.graph import StateGraph, START, END
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import as_completed
+from functools import lru_cache
+from pathlib import Path
+from typing import Annotated, Callable, TypedDict, Optional, List, Dict, Tuple
+
 from dotenv import load_dotenv
-load_dotenv()
-from langsmith import utils
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
 from langsmith import traceable
-from typing import Annotated
-import operator
-utils.tracing_is_enabled()
-
 
-model = ChatGroq(model=os.getenv("MODEL"), temperature=0, api_key=os.getenv("GROQ_API_KEY"))
+from artifacts import project_entries, stream_zip
+import metrics
+from dependencies import resolve_requirements
+from edits import EDIT_FORMAT_INSTRUCTIONS, EditError, apply_edits, parse_edit_blocks
+from llm_cache import cached_response, store_response
+import progress
+from planning import PlanContinuation, PlanParseError, ProjectPlan, continue_plan_prompt, fix_json_prompt, merge_plans, parse_plan
+from project_store import content_hash, flush_project, write_atomically
+from sandbox import check_modules
+from static_checks import imported_files, imported_names, validate_sources
+from symbol_index import build_symbol_index, generation_waves, infer_dependencies, symbol_context, symbol_entry
 
+load_dotenv()
 
-import logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from langsmith import utils
-from langsmith import traceable
-utils.tracing_is_enabled()
 
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "8"))
+
+# Stream generated code token by token and publish progress events instead
+# of waiting for complete responses. Cached answers are replayed at once.
+STREAM_OUTPUT = os.getenv("STREAM_OUTPUT", "false").lower() == "true"
+
+# How run_code validates generated modules: "run" executes them, "import"
+# only executes their top level and "compile" only compiles them. Every
+# module gets RUN_TIMEOUT seconds and RUN_MEMORY_LIMIT_MB of memory.
+RUN_MODE = os.getenv("RUN_MODE", "import")
+RUN_TIMEOUT = float(os.getenv("RUN_TIMEOUT", "30"))
+RUN_MEMORY_LIMIT_MB = int(os.getenv("RUN_MEMORY_LIMIT_MB", "1024"))
+
+# SRD documents longer than SRD_CHUNK_CHARS are split into sections that are
+# summarised in parallel before planning. Plans are cached per document in
+# PLAN_CACHE_DIR; set it to an empty value to disable the cache.
+SRD_CHUNK_CHARS = int(os.getenv("SRD_CHUNK_CHARS", "12000"))
+PLAN_CACHE_DIR = os.getenv("PLAN_CACHE_DIR", ".plan_cache")
+
+# Generated dependencies are pasted into a file's prompt up to this many
+# characters; beyond it only their symbol index entries are included.
+DEPENDENCY_CONTEXT_CHARS = int(os.getenv("DEPENDENCY_CONTEXT_CHARS", "8000"))
+
+# Every completed node is checkpointed to this SQLite file, keyed by the run's
+# thread id, so failed runs can be resumed. Set it to an empty value to
+# disable checkpointing.
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", ".checkpoints.sqlite")
+
+# The plan is requested in the model's JSON mode. Invalid plans are sent
+# back to the model for correction up to PLAN_FIX_ATTEMPTS times.
+PLAN_JSON_MODE = os.getenv("PLAN_JSON_MODE", "true").lower() == "true"
+PLAN_FIX_ATTEMPTS = int(os.getenv("PLAN_FIX_ATTEMPTS", "2"))
+
+# The requirements of the generated project are resolved from its imports
+# and installed into a virtual environment in the background while the code is
+# reviewed and improved; run_code and final_execution run the modules with its
+# interpreter. Environments are shared by projects with the same requirements
+# and packages are installed from a wheelhouse, both kept in
+# DEPENDENCY_CACHE_DIR. Every pip command gets INSTALL_TIMEOUT seconds.
+# Disabled for offline benchmarks, which use the current interpreter.
+INSTALL_DEPENDENCIES = os.getenv("INSTALL_DEPENDENCIES", "true").lower() == "true"
+DEPENDENCY_CACHE_DIR = os.getenv("DEPENDENCY_CACHE_DIR", ".dependency_cache")
+INSTALL_TIMEOUT = float(os.getenv("INSTALL_TIMEOUT", "600"))
+
+# How improve_file and repair_file change a file: "search_replace" asks the
+# model for SEARCH/REPLACE blocks and applies them locally, falling back to a
+# full rewrite when they do not apply; "full" always asks for the whole file.
+EDIT_MODE = os.getenv("EDIT_MODE", "search_replace")
+
+# Files derived from the generated code, which are neither generated nor
+# reviewed by the model.
+DERIVED_FILES = ("requirements.txt",)
+
+# Also write the packaged project as a zip next to the project folder, e.g.
+# for command line runs. Jobs stream the archive when it is downloaded.
+WRITE_ARTIFACT_ZIP = os.getenv("WRITE_ARTIFACT_ZIP", "false").lower() == "true"
+
+# Every model call runs on a tier: "strong" uses MODEL and "fast" uses
+# FAST_MODEL, or MODEL when it is not set. NODE_MODEL_TIERS assigns nodes to
+# tiers as comma separated node=tier pairs; other nodes use the strong tier.
+# Fast answers that fail validation are requested again from the strong model.
+MODEL_TIERS = ("strong", "fast")
+
+
+def parse_node_model_tiers(value: str) -> Dict[str, str]:
+
+    """Parses NODE_MODEL_TIERS. Pairs that are not node=tier or name an
+    unknown tier are logged and ignored, so their nodes use the strong tier."""
+
+    tiers = {}
+    for pair in value.split(","):
+        if not pair.strip():
+            continue
+        node, separator, tier = (part.strip() for part in pair.partition("="))
+        if not separator or not node:
+            logger.warning(f"Ignoring NODE_MODEL_TIERS entry {pair.strip()!r}: expected node=tier")
+        elif tier not in MODEL_TIERS:
+            logger.warning(f"Ignoring NODE_MODEL_TIERS entry {pair.strip()!r}: the tier must be one of {', '.join(MODEL_TIERS)}")
+        else:
+            tiers[node] = tier
+    return tiers
+
+
+NODE_MODEL_TIERS = parse_node_model_tiers(os.getenv("NODE_MODEL_TIERS", "reflect_file=fast,generate_test_file=fast"))
+
+# Chat models set with use_model, by tier, that replace the configured ones.
+_model_overrides: Dict[str, object] = {}
+
+
+@lru_cache(maxsize=None)
+def get_llm_cache():
+
+    """Returns the shared response cache, or None when LLM_CACHE_PATH is set
+    to an empty value. Responses at temperature=0 are reused across runs."""
+
+    from llm_cache import SQLiteLLMCache
+
+    database_path = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite")
+    if not database_path:
+        return None
+    return SQLiteLLMCache(
+        database_path=database_path,
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+        max_age_seconds=float(os.getenv("LLM_CACHE_MAX_AGE")) if os.getenv("LLM_CACHE_MAX_AGE") else None,
+    )
+
+@lru_cache(maxsize=None)
+def get_environment_cache():
+
+    """Returns the shared cache of virtual environments of generated projects."""
+
+    from dependencies import EnvironmentCache
+
+    return EnvironmentCache(cache_dir=DEPENDENCY_CACHE_DIR, timeout=INSTALL_TIMEOUT)
+
+def use_model(model, fast_model=None) -> None:
+
+    """Makes every node call the given chat model instead of the configured
+    Groq models, e.g. a fake model in benchmarks. Nodes on the fast tier call
+    fast_model when it is given. None restores the configured models."""
+
+    _model_overrides.clear()
+    if model is not None:
+        _model_overrides.update(strong=model, fast=fast_model or model)
+
+def get_model(tier: str = "strong"):
+
+    """Returns the chat model of a tier: the one set with use_model, or the
+    configured Groq client."""
+
+    if tier in _model_overrides:
+        return _model_overrides[tier]
+    model_name = os.getenv("MODEL")
+    if tier == "fast":
+        model_name = os.getenv("FAST_MODEL") or model_name
+    return get_groq_model(model_name)
 
-from typing import Annotated
-import operator
+@lru_cache(maxsize=None)
+def get_groq_model(model_name: str):
+
+    """Creates the Groq client of a model on first use and returns the same
+    client afterwards."""
+
+    from langchain_groq import ChatGroq
+
+    # Token bucket shared by every call to this model so concurrent requests
+    # stay under the provider's per-model rate limit. Time spent waiting for a
+    # token is recorded.
+    rate_limiter = metrics.TimedRateLimiter(
+        requests_per_second=float(os.getenv("REQUESTS_PER_SECOND", "0.5")),
+        check_every_n_seconds=0.1,
+        max_bucket_size=int(os.getenv("RATE_LIMIT_BURST", str(MAX_CONCURRENCY))),
+    )
+
+    return ChatGroq(model=model_name, temperature=0, api_key=os.getenv("GROQ_API_KEY"), rate_limiter=rate_limiter, cache=get_llm_cache())
+
+def model_tiers(node: str) -> List[str]:
+
+    """Returns the tiers asked for a node's answer, in order: the node's own
+    tier, then the strong tier when it is a different model."""
+
+    tier = NODE_MODEL_TIERS.get(node, "strong")
+    if tier != "strong" and get_model(tier) is not get_model("strong"):
+        return [tier, "strong"]
+    return [tier]
+
+def ask_model(node: str, ask: Callable, validate: Optional[Callable[[str], None]] = None) -> str:
+
+    """Returns ask(model) for the model of a node's tier. An answer of a
+    cheaper tier for which ask or validate raises ValueError is requested
+    again from the strong model. The strong model's answer is returned
+    without validate, and errors raised by ask propagate."""
+
+    tiers = model_tiers(node)
+    for tier in tiers[:-1]:
+        try:
+            answer = ask(get_model(tier))
+            if validate is not None:
+                validate(answer)
+            return answer
+        except ValueError as e:
+            logger.info(f"Escalating {node} from the {tier} model to the strong model: {e}")
+            metrics.record_retry("escalation")
+    return ask(get_model(tiers[-1]))
+
+def require_answer(answer: str) -> None:
+
+    """Rejects an empty model answer."""
+
+    if not answer.strip():
+        raise ValueError("The answer is empty")
+
+def require_syntax(file_path: str, code: str) -> None:
+
+    """Rejects the code of a Python file that does not parse."""
+
+    if file_path.endswith(".py"):
+        try:
+            ast.parse(code, filename=file_path)
+        except SyntaxError as e:
+            raise ValueError(f"{file_path} does not parse: {e.msg} (line {e.lineno})")
+
+def merge_dicts(current: Optional[Dict[str, str]], update: Optional[Dict[str, str]]) -> Dict[str, str]:
+
+    """Reducer that merges per-file mappings written by different nodes."""
+
+    return {**(current or {}), **(update or {})}
+
+def merge_feedback(current: Optional[Dict[str, str]], update: Optional[Dict[str, str]]) -> Dict[str, str]:
+
+    """Reducer for code_feedback: merges the feedback returned by parallel
+    per-file branches, while a None update clears it for a new pass."""
+
+    if update is None:
+        return {}
+    return {**(current or {}), **update}
 
 class FileStructureState(TypedDict):
    
    """A TypedDict representing the state of the file structure generation
    process with attributes: srd_text (str), file_structure (Optional[List[str]]),
    file_descriptions (Optional[Dict[str, str]]), folder_path (str), error_log
-   Optional[str]), retry_count (int), code_feedback (Optional[Dict[str, str]]),
-   improvement_count (int)."""
+   (Optional[Dict[str, str]]) with the error output of every failing file, retry_count (int), code_feedback (Optional[Dict[str, str]]),
+   improvement_count (int), file_hashes (Dict[str, str]) with the content hash
+   of every generated file, and converged (Dict[str, str]) with the content hash
+   at which each file stopped needing changes, project_files
+   (Dict[str, str]) with the content of every project file, flushed
+   (Dict[str, str]) with the content hash of every file as last written to
+   disk, artifact_path (Optional[str]) with the folder the artifact is packaged from."""
    
-   srd_text: Annotated[str, operator.add]
-   file_structure: Annotated[List[str], operator.add]
-   file_descriptions: Annotated[Dict[str, str], lambda a, b: {**a, **b}]
+   srd_text: str
+   file_structure: Optional[List[str]]
+   file_descriptions: Annotated[Dict[str, str], merge_dicts]
    folder_path: str
-   error_log: Optional[str]
+   error_log: Optional[Dict[str, str]]
    retry_count: int
-   code_feedback: Optional[Dict[str, str]]
+   code_feedback: Annotated[Dict[str, str], merge_feedback]
    improvement_count: int
+   file_hashes: Annotated[Dict[str, str], merge_dicts]
+   converged: Annotated[Dict[str, str], merge_dicts]
+   project_files: Annotated[Dict[str, str], merge_dicts]
+   flushed: Annotated[Dict[str, str], merge_dicts]
+   artifact_path: Optional[str]
+
+class FileTask(TypedDict):
+
+   """Payload of a per-file branch started with Send: folder_path (str),
+   file_path (str), code (str) with the file's current content, feedback
+   (Optional[str])."""
+
+   folder_path: str
+   file_path: str
+   code: str
+   feedback: Optional[str]
+
+class RepairTask(FileTask):
+
+   """Payload of a repair_file branch: a FileTask whose feedback is the
+   error output, plus dependencies (Dict[str, str]) with the sources of the
+   project files it imports."""
+
+   dependencies: Dict[str, str]
  
-from json import JSONDecodeError
 
+NO_CHANGES_MARKER = "NO CHANGES NEEDED"
+
+def flush(state: FileStructureState) -> Dict[str, str]:
+
+    """Writes the project files that changed since the last flush to the
+    project folder and returns their content hashes for the flushed field."""
+
+    written = flush_project(state["folder_path"], state.get("project_files") or {}, state.get("flushed") or {})
+    if written:
+        logger.info(f"Flushed {len(written)} files to {state['folder_path']}")
+    return written
+
+def sync_requirements(state: FileStructureState) -> List[str]:
+
+    """Resolves the requirements of the current Python files, tests included,
+    and writes them to requirements.txt in the project store. Returns the
+    requirements of the files in file_structure only: run_code and
+    final_execution never run the generated tests, so the environment
+    started by write_code_to_files, before any test exists, is the one they
+    use."""
+
+    project_files = state.get("project_files") or {}
+    file_paths = list(project_files)
+    requirements = resolve_requirements(project_files, file_paths)
+    state["project_files"] = {**project_files, "requirements.txt": "".join(f"{requirement}\n" for requirement in requirements)}
+    runtime_sources = {file_path: project_files[file_path] for file_path in state.get("file_structure") or [] if file_path in project_files}
+    return resolve_requirements(runtime_sources, file_paths)
+
+def project_python(requirements: List[str]) -> Optional[str]:
+
+    """Waits for the environment of a requirement set and returns its
+    interpreter. Returns None, for the current interpreter, when
+    INSTALL_DEPENDENCIES is off or the environment could not be created."""
+
+    if not INSTALL_DEPENDENCIES:
+        return None
+    start = time.perf_counter()
+    future = get_environment_cache().prepare(requirements)
+    try:
+        return future.result()
+    except Exception as e:
+        logger.error(f"Could not create the project environment, using the current interpreter: {e}")
+        return None
+    finally:
+        metrics.record_queue_wait("dependencies", time.perf_counter() - start)
+
+def is_converged(state: FileStructureState, file_path: str) -> bool:
+
+    """A file is converged while its current content is the one at which
+    the reviewer asked for no changes or an improvement left it unchanged.
+    Derived files are always converged."""
+
+    if file_path in DERIVED_FILES:
+        return True
+    file_hash = (state.get("file_hashes") or {}).get(file_path)
+    return file_hash is not None and (state.get("converged") or {}).get(file_path) == file_hash
+
+
+def split_srd(srd_text: str, max_chars: int) -> List[str]:
+
+    """Splits an srd document into chunks of at most max_chars characters,
+    breaking between lines wherever possible."""
+
+    chunks = []
+    current = []
+    size = 0
+    for line in srd_text.split("\n"):
+        if current and (len(line) > max_chars or size + len(line) + 1 > max_chars):
+            chunks.append("\n".join(current))
+            current = []
+            size = 0
+        while len(line) > max_chars:
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+@traceable
+def summarise_srd_chunk(chunk: str, index: int, total: int) -> str:
+
+    """Extracts the requirements from one section of the srd document."""
+
+    prompt = f"""
+    You are a software architect. The following is part {index} of {total} of an srd document:
+    {chunk}
+    - Extract every functional and non-functional requirement, entity, data field, API endpoint and constraint described in this part.
+    - Keep names, fields and values exactly as they are written.
+    - Return a concise bullet list without any additional text.
+    """
+
+    summary = ask_model("summarise_srd_chunk", lambda model: model.invoke(prompt).content, require_answer)
+    return summary.strip()
+
+def condense_srd(srd_text: str) -> str:
+
+    """Returns the srd document unchanged when it fits in one planning prompt.
+    Longer documents are reduced to the requirements extracted from their
+    sections, summarised in parallel and summarised again until they fit."""
+
+    text = srd_text
+    for _ in range(3):
+        if len(text) <= SRD_CHUNK_CHARS:
+            break
+        chunks = split_srd(text, SRD_CHUNK_CHARS)
+        logger.info(f"Summarising {len(chunks)} srd sections")
+        with ContextThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+            summaries = list(executor.map(summarise_srd_chunk, chunks, range(1, len(chunks) + 1), [len(chunks)] * len(chunks)))
+        text = "\n\n".join(f"Section {index}:\n{summary}" for index, summary in enumerate(summaries, 1))
+    return text
+
+def plan_cache_path(srd_text: str) -> str:
+
+    """Returns the plan cache file of an srd document and model."""
+
+    key = hashlib.sha256(f"{os.getenv('MODEL')}\0{srd_text}".encode("utf-8")).hexdigest()
+    return os.path.join(PLAN_CACHE_DIR, f"{key}.json")
 
 @traceable
 def srd_to_file_structure(state: FileStructureState) -> FileStructureState:
  
-    """Generates a file structure and descriptions from the srd document."""
+    """Generates a file structure and descriptions from the srd document.
+    Large documents are planned from their summarised sections, and plans are
+    reused when the same document is planned again. The plan is validated
+    against the ProjectPlan schema.
+
+    Raises:
+        PlanParseError: If the model does not produce a valid plan.
+    """
+
+    cache_path = plan_cache_path(state["srd_text"]) if PLAN_CACHE_DIR else None
+    if cache_path and os.path.exists(cache_path):
+        logger.info(f"Using cached plan {cache_path}")
+        with open(cache_path, "r") as f:
+            plan = json.load(f)
+        state["file_structure"] = plan["files"]
+        state["file_descriptions"] = plan["descriptions"]
+        return state
+
+    srd_content = condense_srd(state["srd_text"])
    
     prompt = f"""
     You are a software architect. Given the following srd document:
-    {state["srd_text"]}
+    {srd_content}
     - Generate a structured JSON file tree.
     - Provide a Detailed description of each file's purpose and what should be inside it and generate Docker file as well and create readme file and requirements.txt and documentation.txt.
     - do not generate tests
@@ -69,84 +457,212 @@ def srd_to_file_structure(state: FileStructureState) -> FileStructureState:
     - Ensure the response is in valid JSON format without any additional text, markdown, or code blocks.
     """
    
-    response = model.invoke(prompt)
-    response_str = response.content
-    with open("debug_response.json", "w") as debug_file:
+    response_str = request_plan(prompt)
+    debug_dir = os.path.dirname(state["folder_path"])
+    if debug_dir:
+        os.makedirs(debug_dir, exist_ok=True)
+    with open(os.path.join(debug_dir, "debug_response.json"), "w") as debug_file:
         debug_file.write(response_str)
-    # print("Raw Response:",response_str)
-    
 
+    plan, complete = parse_plan_with_fixes(response_str, prompt)
+    state["file_structure"] = plan.files
+    state["file_descriptions"] = plan.descriptions
+    # A truncated plan may be missing files, so the document is planned again
+    # next time.
+    if cache_path and complete:
+        os.makedirs(PLAN_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump(plan.model_dump(), f)
+
+    return state
+
+def request_plan(prompt: str) -> str:
+
+    """Asks the model for a plan and returns the raw answer, in JSON mode
+    when PLAN_JSON_MODE is set. A JSON mode answer the provider rejected as
+    invalid JSON is returned as well, so it can be corrected instead of
+    planned again."""
+
+    model = get_model(NODE_MODEL_TIERS.get("srd_to_file_structure", "strong"))
+    if not PLAN_JSON_MODE:
+        return model.invoke(prompt).content
     try:
-        json_match = re.search(r"```json\s+(.*?)\s+```", response_str, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-            json_data = json.loads(json_str)
+        return model.bind(response_format={"type": "json_object"}).invoke(prompt).content
+    except Exception as e:
+        # Groq reports the rejected answer in the body of the error.
+        body = getattr(e, "body", None)
+        error = body.get("error") if isinstance(body, dict) else None
+        failed_generation = error.get("failed_generation") if isinstance(error, dict) else None
+        if not failed_generation:
+            raise
+        logger.info(f"The model's JSON mode rejected the plan: {e}")
+        return failed_generation
+
+def parse_plan_with_fixes(response_str: str, prompt: str) -> Tuple[ProjectPlan, bool]:
+
+    """Parses the plan in a model answer. An invalid plan is sent back to
+    the model with its validation error, without the srd document, for a
+    corrected version. A plan cut off at the output limit is completed
+    instead by asking with prompt for only its missing part. Returns the
+    plan and whether it is complete; when the rest of a cut off plan cannot
+    be had, the plan so far is used but reported as incomplete.
+
+    Raises:
+        PlanParseError: If the plan is still invalid after PLAN_FIX_ATTEMPTS
+            corrections.
+    """
+
+    for attempt in range(PLAN_FIX_ATTEMPTS + 1):
+        try:
+            return parse_plan(response_str), True
+        except PlanParseError as e:
+            if e.recovered is not None:
+                return complete_plan(e.recovered, prompt)
+            if attempt == PLAN_FIX_ATTEMPTS:
+                raise
+            logger.info(f"Invalid plan, asking for a correction: {e}")
+            metrics.record_retry("plan_json_fix")
+            response_str = request_plan(fix_json_prompt(response_str, str(e)))
+
+def complete_plan(plan: ProjectPlan, prompt: str) -> Tuple[ProjectPlan, bool]:
+
+    """Asks for the missing part of a cut off plan, up to PLAN_FIX_ATTEMPTS
+    times while the answers are cut off as well, and merges it into the
+    plan. Returns the plan and whether it is complete."""
+
+    for _ in range(PLAN_FIX_ATTEMPTS):
+        logger.info(f"The plan is cut off after {len(plan.files)} files, asking for the rest")
+        metrics.record_retry("plan_continuation")
+        response_str = request_plan(continue_plan_prompt(prompt, plan))
+        try:
+            return merge_plans(plan, parse_plan(response_str, PlanContinuation)), True
+        except PlanParseError as e:
+            if e.recovered is None:
+                logger.warning(f"Invalid continuation of the plan: {e}")
+                break
             try:
-                json_data = json.loads(json_str)
-            except JSONDecodeError as e:
-                logger.info(f"JSONDecodeError: {e}")
-                logger.info("Invalid JSON Response:", json_str)
-                raise e
-            state["file_structure"] = json_data["files"]
-            state["file_descriptions"] = json_data["descriptions"]
-        else:
-            logger.info("JSON data not found in the response.")
-    except JSONDecodeError as e:
-        logger.info(f"JSONDecodeError: {e}")
-        logger.info("Response content:", response_str)
-        raise e
- 
-    return state
+                plan = merge_plans(plan, e.recovered)
+            except PlanParseError as merge_error:
+                logger.warning(f"Invalid continuation of the plan: {merge_error}")
+                break
+    logger.warning(f"Using a truncated plan with {len(plan.files)} files")
+    return plan, False
 
 @traceable
 def create_files_tool(state: FileStructureState) -> FileStructureState:
  
-    """Creates files and stores descriptions for the next step."""
+    """Creates the project folder. File contents are kept in the project_files
+    store and only written to disk when the project is flushed."""
    
     folder_path = state.get("folder_path", "generated_project")
-    file_structure = state.get("file_structure", [])
-    file_descriptions = state.get("file_descriptions", {})
- 
-    if not os.path.exists(folder_path):
-        os.makedirs(folder_path)
- 
-    for file_path in file_structure:
-        full_path = os.path.join(folder_path, file_path)
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
- 
-        with open(full_path, "w") as f:
-            f.write(f"# Description: {file_descriptions.get(file_path, 'No description available')}\n\n")
+    os.makedirs(folder_path, exist_ok=True)
  
     return state
 
-import os
-import subprocess
-import sys
-from dotenv import load_dotenv
- 
-def write_code_to_files(state: dict) -> dict:
- 
-    """Writes code into the generated files based on descriptions and
-    appends requirements to requirements.txt."""
- 
-    folder_path = state.get("folder_path", "generated_project")
-    file_structure = state.get("file_structure", [])
-    file_descriptions = state.get("file_descriptions", {})
- 
-    requirements = set()
- 
-    for file_path in file_structure:
-        full_path = os.path.join(folder_path, file_path)
-        description = file_descriptions.get(file_path, "")
-        logger.info(full_path, description)
- 
-        prompt = f"""
+def request_code(prompt: str, file_path: str, node: str) -> str:
+
+    """Returns the answer of the model of a node's tier without markdown
+    fences. In STREAM_OUTPUT mode the answer is assembled line by line as
+    tokens arrive and progress events are published. Python code of a
+    cheaper tier that does not parse is requested from the strong model."""
+
+    request = stream_code if STREAM_OUTPUT else invoke_code
+    return ask_model(node, lambda model: request(model, prompt, file_path), lambda code: require_syntax(file_path, code))
+
+def invoke_code(model, prompt: str, file_path: str) -> str:
+
+    """Returns a model's complete answer without markdown fences."""
+
+    response = model.invoke(prompt)
+    code = response.content.strip()
+    code_lines = code.split('\n')
+    filtered_code = "\n".join(line for line in code_lines if "```" not in line)
+    progress.publish({"event": "file_written", "file": file_path, "chars": len(filtered_code)})
+    return filtered_code
+
+def stream_code(model, prompt: str, file_path: str) -> str:
+
+    """Returns a model's streamed answer without markdown fences, publishing
+    progress events for every complete line. Streaming bypasses the model's
+    response cache, so the answer is looked up in it first and stored in
+    it afterwards."""
+
+    progress.publish({"event": "file_started", "file": file_path})
+    written = []
+    pending_blank = []
+    buffer = ""
+    chars = 0
+
+    def emit(line: str) -> None:
+        nonlocal chars
+        if "```" in line:
+            return
+        # Blank lines are held back so leading and trailing ones are
+        # dropped, as with strip() on a complete response.
+        if not line.strip():
+            if written:
+                pending_blank.append(line)
+            return
+        for text in pending_blank + [line]:
+            written.append(text)
+            chars += len(text) + 1
+        pending_blank.clear()
+        progress.publish({"event": "file_progress", "file": file_path, "chars": chars})
+
+    cached = cached_response(model, prompt)
+    pieces = [cached] if cached is not None else (chunk.content for chunk in model.stream(prompt))
+    answer = []
+    for piece in pieces:
+        answer.append(piece)
+        buffer += piece
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            emit(line)
+    emit(buffer)
+    if cached is None:
+        store_response(model, prompt, "".join(answer))
+
+    progress.publish({"event": "file_written", "file": file_path, "chars": chars})
+    return "\n".join(written)
+
+def request_edits(prompt: str, file_path: str, code: str, node: str) -> str:
+
+    """Asks the model of a node's tier for SEARCH/REPLACE edits of a file and
+    returns the edited code. An answer without edits that says
+    NO_CHANGES_MARKER leaves the code unchanged. Edits of a cheaper tier that
+    cannot be applied are requested from the strong model.
+
+    Raises:
+        EditError: If the answer holds no edits or they cannot be applied.
+    """
+
+    def edit(model) -> str:
+        answer = model.invoke(prompt).content
+        blocks = parse_edit_blocks(answer)
+        if not blocks and NO_CHANGES_MARKER not in answer.upper():
+            raise EditError("The answer contains no SEARCH/REPLACE blocks")
+        return apply_edits(file_path, code, blocks)
+
+    edited = ask_model(node, edit)
+    progress.publish({"event": "file_written", "file": file_path, "chars": len(edited)})
+    return edited
+
+def generate_file_code(file_path: str, description: str, context: str = "None") -> str:
+
+    """Asks the model for the code of a single file and returns it. context
+    lists the symbols of the project files it uses."""
+
+    prompt = f"""
         You are a Senior FastAPI developer. Generate a complete Python file based **only** on the following description:  
         {description}  
  
+        ### **Project Modules This File Uses:**  
+        {context}  
+ 
         ### **Constraints:**  
         - **Only generate code for this specific file:** {file_path}  
         - **Do not generate code for any other files.**  
+        - **Import project modules by the module paths shown above, and from modules whose names are listed only those names.**  
         - **Strictly adhere to the extracted requirements from the description.**  
         - **Do not assume or add extra functionality beyond what is specified.**  
         - **Follow FastAPI best practices, keeping the code minimal yet correct.**  
@@ -158,80 +674,135 @@ def write_code_to_files(state: dict) -> dict:
         -***Do not include any additional text, explanations, or comments outside the code.**
         - **Do not include any code blocks or markdown formatting.**
         """
+
+    return request_code(prompt, file_path, "write_code")
+
+def dependency_context(
+    file_path: str, dependencies: Dict[str, List[str]], symbol_index: Dict[str, dict],
+    generated: Dict[str, str], importers: Dict[str, Dict[str, List[str]]],
+) -> str:
+
+    """Describes the project files a file depends on for its prompt: the
+    generated code of each dependency while it fits in
+    DEPENDENCY_CONTEXT_CHARS, and its symbol index entry otherwise. The
+    names that already generated files import from the file are listed as
+    well, so it defines them."""
+
+    parts = [
+        f"- {importer} imports these names from this file, so define them: {', '.join(names)}"
+        for importer, names in importers.get(file_path, {}).items()
+    ]
+    budget = DEPENDENCY_CONTEXT_CHARS
+    for dependency in dependencies.get(file_path, []):
+        code = generated.get(dependency)
+        if code is not None and len(code) <= budget:
+            budget -= len(code)
+            parts.append(f"- {dependency} (import as {symbol_index[dependency]['module']}):\n{code}")
+        else:
+            parts.append(symbol_context(symbol_index, [dependency]))
+    if not dependencies.get(file_path):
+        # The descriptions may not name every module a file needs, e.g. the
+        # routers main.py includes, so the file may still import any of them.
+        modules = [f"{entry['module']} ({other})" for other, entry in symbol_index.items() if other != file_path]
+        parts.append(f"No project modules are known to be needed. The project modules are: {', '.join(modules) or 'None'}")
+    return "\n\n".join(parts)
+
+def write_code_to_files(state: dict) -> dict:
  
-        response = model.invoke(prompt)
-        code = response.content.strip()
- 
-        code_lines = code.split('\n')
-        filtered_code = "\n".join(line for line in code_lines if "```" not in line)
- 
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        with open(full_path, "w") as f:
-            f.write(filtered_code)
- 
-        for line in code_lines:
-            if "import " in line or "from " in line:
-                parts = line.split()
-                if parts[0] == "import":
-                    requirement = parts[1].split('.')[0]
-                elif parts[0] == "from":
-                    requirement = parts[1].split('.')[0]
-                if requirement not in file_structure and requirement != "main" and requirement not in file_descriptions:
-                    requirements.add(requirement)
- 
-    requirements_path = os.path.join(folder_path, "requirements.txt")
-    with open(requirements_path, "w") as req_file:
-        for requirement in sorted(requirements):
-            req_file.write(f"{requirement}\n")
- 
-    if os.path.exists(requirements_path):
-        logger.info("Installing dependencies...")
-        try:
-            result = subprocess.run([sys.executable, "-m", "pip", "install", "-r", requirements_path], check=True, capture_output=True, text=True)
-            logger.info(result.stdout)
-        except subprocess.CalledProcessError as e:
-            logger.info(f"Failed to install dependencies: {e}")
- 
-    venv_path = os.path.join(folder_path, "venv")
-    if not os.path.exists(venv_path):
-        logger.info("Creating virtual environment...")
-        subprocess.check_call([sys.executable, "-m", "venv", venv_path])
- 
-    if os.name == "nt":
-        activate_script = os.path.join(venv_path, "Scripts", "activate")
-    else:
-        activate_script = os.path.join(venv_path, "bin", "activate")
+    """Generates the code of every file based on descriptions, collects
+    the requirements in requirements.txt and starts installing them.
+
+    Files are generated in topological waves of the dependency graph
+    inferred from the descriptions. All files of a wave are generated
+    concurrently, up to MAX_CONCURRENCY requests at a time. The code is
+    kept in the project_files store and flushed to the project folder in
+    one batch once every file is generated. Each prompt carries the real generated
+    code, or the symbol index entries, of the files it depends on, and the
+    names that the generated code of earlier waves imports from the file,
+    which the descriptions may not mention. requirements.txt is derived from
+    the imports instead of being generated."""
  
-    env_path = os.path.join(folder_path, ".env")
-    if not os.path.exists(env_path):
-        logger.info("Creating .env file...")
-        with open(env_path, "w") as env_file:
-            env_file.write("KEY=VALUE\n")  
-           
-    if os.path.exists(env_path):
-        logger.info("Loading environment variables...")
-        load_dotenv(env_path)
+    folder_path = state.get("folder_path", "generated_project")
+    file_structure = state.get("file_structure", [])
+    file_descriptions = state.get("file_descriptions", {})
  
-    logger.info("Environment setup complete.")
+    generated = {}
+    # Names imported by generated files from files not generated yet, keyed
+    # by the imported file and then by the importing one.
+    importers: Dict[str, Dict[str, List[str]]] = {}
+    symbol_index = build_symbol_index(file_structure, file_descriptions)
+    dependencies = infer_dependencies(file_structure, file_descriptions)
+    waves = generation_waves(file_structure, dependencies)
+ 
+    # The context is copied into the worker threads so model calls are
+    # attributed to this node and run.
+    with ContextThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+        for wave_number, wave in enumerate(waves, 1):
+            logger.info(f"Generating wave {wave_number} of {len(waves)} with {len(wave)} files")
+            futures = {
+                executor.submit(
+                    generate_file_code, file_path, file_descriptions.get(file_path, ""),
+                    dependency_context(file_path, dependencies, symbol_index, generated, importers),
+                ): file_path
+                for file_path in wave
+                if file_path not in DERIVED_FILES
+            }
+
+            for future in as_completed(futures):
+                file_path = futures[future]
+                filtered_code = future.result()
+                logger.info(f"Generated code for {os.path.join(folder_path, file_path)}")
+                generated[file_path] = filtered_code
+                if file_path.endswith(".py"):
+                    symbol_index[file_path] = symbol_entry(file_path, filtered_code)
+                    for imported, names in imported_names(file_path, filtered_code, file_structure).items():
+                        if imported not in generated:
+                            importers.setdefault(imported, {})[file_path] = names
+
+    project_files = dict(generated)
+    project_files.setdefault(".env", "KEY=VALUE\n")
+
+    state["project_files"] = project_files
+    requirements = sync_requirements(state)
+    state["file_hashes"] = {file_path: content_hash(code) for file_path, code in state["project_files"].items()}
+    state["flushed"] = flush(state)
+    if INSTALL_DEPENDENCIES:
+        logger.info(f"Installing {len(requirements)} requirements in the background")
+        get_environment_cache().prepare(requirements)
     return state
  
 @traceable
 def reflect_on_code(state: FileStructureState) -> FileStructureState:
    
-    """Reads the code and provides feedback for improvements."""
+    """Starts a review pass by clearing the feedback of the previous one.
+    The per-file reviews run as parallel reflect_file branches."""
  
     logger.info("Reflecting the code")
-   
-    folder_path = state["folder_path"]
-    code_feedback = {}
- 
-    for file_path in state["file_structure"]:
-        full_path = os.path.join(folder_path, file_path)
- 
-        with open(full_path, "r") as f:
-            code = f.read()
- 
-        prompt = f"""
+
+    return {"code_feedback": None}
+
+def fan_out_reflection(state: FileStructureState):
+
+    """Sends every generated file that is not converged yet to its own
+    reflect_file branch."""
+
+    project_files = state.get("project_files") or {}
+    sends = [
+        Send("reflect_file", {"folder_path": state["folder_path"], "file_path": file_path, "code": project_files.get(file_path, ""), "feedback": None})
+        for file_path in state.get("file_structure") or []
+        if not is_converged(state, file_path)
+    ]
+    return sends or "improve_code"
+
+@traceable
+def reflect_file(task: FileTask) -> dict:
+
+    """Reviews one file and provides feedback for improvements. A file the
+    reviewer is satisfied with is marked as converged instead."""
+
+    code = task["code"]
+
+    prompt = f"""
         You are a senior software reviewer. Analyze the following code:
         ```python
         {code}
@@ -239,97 +810,155 @@ def reflect_on_code(state: FileStructureState) -> FileStructureState:
         - Identify any missing logic.
         - Suggest improvements (performance, best practices, security).
         - List the exact modifications required.
+        - If the code is complete and needs no modifications, reply with only: {NO_CHANGES_MARKER}
         """
- 
-        response = model.invoke(prompt)
-        code_feedback[file_path] = response.content.strip()
- 
-    state["code_feedback"] = code_feedback
-    return state
+
+    feedback = ask_model("reflect_file", lambda model: model.invoke(prompt).content, require_answer).strip()
+    if feedback.upper().startswith(NO_CHANGES_MARKER):
+        file_hash = content_hash(code)
+        return {"file_hashes": {task["file_path"]: file_hash}, "converged": {task["file_path"]: file_hash}}
+    return {"code_feedback": {task["file_path"]: feedback}}
+
 @traceable
 def improve_code(state: FileStructureState) -> FileStructureState:
    
-    """Applies improvements based on reflection feedback, with human
-    intervention after 3 iterations."""
+    """Starts an improvement pass over the reflection feedback, with human
+    intervention after 3 iterations. The rewrites run as parallel
+    improve_file branches."""
  
     logger.info("Improving The Code")
    
-    folder_path = state["folder_path"]
-    code_feedback = state["code_feedback"]
-    state["improvement_count"] = state.get("improvement_count",0) + 1
+    improvement_count = state.get("improvement_count",0) + 1
     
     
-    # if state["improvement_count"] >= 0:
+    # if improvement_count >= 0:
     #     user_input = input("\nAre You Ok With The Code Generated (yes/no): ").strip().lower()
     #     if user_input != "yes":
     #         print("\n[Manual Review] Edit the code manually and press Enter to continue...")
     #         input()
     #         return state
    
-    for file_path, feedback in code_feedback.items():
-        full_path = os.path.join(folder_path, file_path)
- 
-        with open(full_path, "r") as f:
-            existing_code = f.read()
- 
-        prompt = f"""
-        You are a senior software engineer. Improve the following Python code:
+    return {"improvement_count": improvement_count}
+
+def fan_out_improvements(state: FileStructureState):
+
+    """Sends every file that received feedback to its own improve_file branch."""
+
+    project_files = state.get("project_files") or {}
+    sends = [
+        Send("improve_file", {"folder_path": state["folder_path"], "file_path": file_path, "code": project_files.get(file_path, ""), "feedback": feedback})
+        for file_path, feedback in (state.get("code_feedback") or {}).items()
+    ]
+    return sends or "collect_improvements"
+
+@traceable
+def improve_file(task: FileTask) -> dict:
+
+    """Changes one file based on its reflection feedback, with edits in
+    EDIT_MODE "search_replace" and by rewriting it otherwise or when the edits
+    do not apply. A change that leaves the content unchanged marks the file
+    as converged."""
+
+    file_path = task["file_path"]
+    existing_code = task["code"]
+
+    filtered_code = None
+    if EDIT_MODE == "search_replace":
+        edit_prompt = f"""
+        You are a senior software engineer. Improve the following code of {file_path}:
         ```python
         {existing_code}
         ```
         Based on the following feedback:
         ```
-        {feedback}
+        {task["feedback"]}
         ```
         ### **Constraints:**  
-        - **Only generate code for this specific file:** {file_path}  
-        - **Do not generate code for any other files.**  
-        - **Strictly adhere to the extracted requirements from the description.**  
+        - **Change only what the feedback asks for and keep everything else as it is.**  
         - **Do not assume or add extra functionality beyond what is specified.**  
-        - **Follow FastAPI best practices, keeping the code minimal yet correct.**  
-        - **Use clear and concise variable and function names.**  
-        - **Ensure modularity and error handling but avoid unnecessary abstractions.**  
-        - **Include only relevant docstrings and comments.**  
-        - **Do not generate unit tests unless explicitly requested.**  
-        - **Do Not Give Anything Like pip installs and everything that is present should be python. Do not give notes as well.**
-        - **Do Not Add Any Thing Likes notes anything extra strict give only the python code**
-        -- *** DO NOT MENTION ANYTHING ELSE OTHER THAN PYTHON IN THE FILE I DONT WANT YOUR ASUPTIONS AND EVERY THING ELSE SHOULD NOT BE PRESENT NO EXTRA TEXT SHOULD BE PRESENT***
-        """
- 
-        response = model.invoke(prompt)
-        improved_code = response.content.strip()
- 
-        code_lines = improved_code.split('\n')
-        filtered_code = "\n".join(line for line in code_lines if "```" not in line)
- 
- 
-        with open(full_path, "w") as f:
-            f.write(filtered_code)
- 
-    return state
+        - **If no change is needed, reply with only:** {NO_CHANGES_MARKER}
+        {EDIT_FORMAT_INSTRUCTIONS}"""
+        try:
+            filtered_code = request_edits(edit_prompt, file_path, existing_code, "improve_file")
+        except EditError as e:
+            logger.info(f"Could not apply the edits to {file_path}, rewriting it: {e}")
+            metrics.record_retry("edit_fallback")
+    if filtered_code is None:
+        prompt = f"""
+            You are a senior software engineer. Improve the following Python code:
+            ```python
+            {existing_code}
+            ```
+            Based on the following feedback:
+            ```
+            {task["feedback"]}
+            ```
+            ### **Constraints:**  
+            - **Only generate code for this specific file:** {file_path}  
+            - **Do not generate code for any other files.**  
+            - **Strictly adhere to the extracted requirements from the description.**  
+            - **Do not assume or add extra functionality beyond what is specified.**  
+            - **Follow FastAPI best practices, keeping the code minimal yet correct.**  
+            - **Use clear and concise variable and function names.**  
+            - **Ensure modularity and error handling but avoid unnecessary abstractions.**  
+            - **Include only relevant docstrings and comments.**  
+            - **Do not generate unit tests unless explicitly requested.**  
+            - **Do Not Give Anything Like pip installs and everything that is present should be python. Do not give notes as well.**
+            - **Do Not Add Any Thing Likes notes anything extra strict give only the python code**
+            -- *** DO NOT MENTION ANYTHING ELSE OTHER THAN PYTHON IN THE FILE I DONT WANT YOUR ASUPTIONS AND EVERY THING ELSE SHOULD NOT BE PRESENT NO EXTRA TEXT SHOULD BE PRESENT***
+            """
+ 
+        filtered_code = request_code(prompt, file_path, "improve_file")
+
+    file_hash = content_hash(filtered_code)
+    update = {"project_files": {file_path: filtered_code}, "file_hashes": {file_path: file_hash}}
+    if file_hash == content_hash(existing_code):
+        update["converged"] = {file_path: file_hash}
+    return update
+
+def collect_improvements(state: FileStructureState) -> FileStructureState:
+
+    """Joins the improve_file branches before deciding on the next pass."""
+
+    return {}
+
 @traceable
 def generate_tests(state: FileStructureState) -> FileStructureState:
  
     """
-    Reads each Python file in the generated project folder and generates a test case
-    for it based on its content. Test cases are stored in a "tests" subfolder as separate files.
+    Starts test generation. A test case for each Python file is generated
+    by a parallel generate_test_file branch.
     """
  
     logger.info("Generating test cases for each Python file...")
-    folder_path = state["folder_path"]
-    test_folder = os.path.join(folder_path, "tests")
-    if not os.path.exists(test_folder):
-        os.makedirs(test_folder)
- 
-    for file_path in state.get("file_structure", []):
-        if not file_path.endswith(".py"):
-            continue
-        full_file_path = os.path.join(folder_path, file_path)
-        with open(full_file_path, "r") as f:
-            code = f.read()
-        logger.info("Creating Test Case For ", full_file_path)
+
+    return {}
+
+def fan_out_tests(state: FileStructureState):
+
+    """Sends every Python file to its own generate_test_file branch."""
+
+    project_files = state.get("project_files") or {}
+    sends = [
+        Send("generate_test_file", {"folder_path": state["folder_path"], "file_path": file_path, "code": project_files.get(file_path, ""), "feedback": None})
+        for file_path in state.get("file_structure") or []
+        if file_path.endswith(".py")
+    ]
+    return sends or "validate_code"
+
+@traceable
+def generate_test_file(task: FileTask) -> dict:
+
+    """
+    Generates a test case for one Python file based on its content. The
+    test case is stored in the "tests" subfolder of the project.
+    """
+
+    file_path = task["file_path"]
+    code = task["code"]
+    logger.info(f"Creating Test Case For {os.path.join(task['folder_path'], file_path)}")
  
-        prompt = f"""
+    prompt = f"""
         You are a senior software tester.
         Analyze the following Python module:
         ```python
@@ -348,140 +977,226 @@ def generate_tests(state: FileStructureState) -> FileStructureState:
         - **Do Not Add Any Thing Likes notes anything extra strict give only the python code**
         -- *** DO NOT MENTION ANYTHING ELSE OTHER THAN PYTHON IN THE FILE I DONT WANT YOUR ASSUMPTIONS AND EVERY THING ELSE SHOULD NOT BE PRESENT NO EXTRA TEXT SHOULD BE PRESENT***
         """
-        response = model.invoke(prompt)
-        test_code = response.content.strip()
- 
-        test_code = "\n".join(line for line in test_code.splitlines() if "```" not in line)
+    test_file_path = f"tests/test_{os.path.basename(file_path)}"
+    test_code = request_code(prompt, test_file_path, "generate_test_file")
  
-        test_file_name = "test_" + os.path.basename(file_path)
-        test_full_path = os.path.join(test_folder, test_file_name)
-        with open(test_full_path, "w") as test_file:
-            test_file.write(test_code)
-        logger.info(f"Generated test case for {file_path} -> {test_file_name}")
+    logger.info(f"Generated test case for {file_path} -> {test_file_path}")
  
-    return state
+    return {"project_files": {test_file_path: test_code}}
+
+@traceable
+def validate_code(state: FileStructureState) -> FileStructureState:
+
+    """Statically checks every generated Python file for syntax errors and
+    unresolved intra-project imports before any interpreter is started.
+    Broken files are recorded in error_log."""
+
+    logger.info("Validating the code")
+
+    project_files = state.get("project_files") or {}
+    sources = {file_path: project_files.get(file_path, "") for file_path in state["file_structure"] if file_path.endswith(".py")}
+
+    error_log = validate_sources(sources)
+    for file_path, error in error_log.items():
+        logger.info(f"Validation failed for {file_path}:\n{error}")
+
+    update = {"error_log": error_log or None}
+    if error_log:
+        update["retry_count"] = state["retry_count"] + 1
+    return update
 
 @traceable
 def run_code(state: FileStructureState) -> FileStructureState:
    
-    """Runs the generated code, captures errors, and retries if necessary."""
+    """Flushes the project to disk and runs the generated modules
+    concurrently in RUN_MODE with the interpreter of the project's
+    environment, each with a timeout and memory limit, and records the
+    errors of every failing file."""
  
     logger.info("Came Inside Runners")
+    requirements = sync_requirements(state)
+    state["flushed"] = flush(state)
+    # Compiling does not start an interpreter, so there is no need to wait
+    # for the environment.
+    python = project_python(requirements) if RUN_MODE != "compile" else None
    
-    folder_path = state["folder_path"]
-    error_log = None
- 
-    for file_path in state["file_structure"]:
-        full_path = os.path.join(folder_path, file_path)
-        if not file_path.endswith(".py"):
-            continue
- 
-        try:
-            result = subprocess.run(["python", full_path], capture_output=True, text=True)
-            if result.returncode != 0:
-                error_log = result.stderr.strip()
-                logger.info(f"Error in {file_path}:\n{error_log}")
-        except Exception as e:
-            error_log = str(e)
- 
-    state["error_log"] = error_log
+    python_files = [file_path for file_path in state["file_structure"] if file_path.endswith(".py")]
+    error_log = check_modules(
+        state["folder_path"], python_files, mode=RUN_MODE, timeout=RUN_TIMEOUT,
+        memory_limit_mb=RUN_MEMORY_LIMIT_MB, max_workers=MAX_CONCURRENCY, python=python,
+    )
+    for file_path, error in error_log.items():
+        logger.info(f"Error in {file_path}:\n{error}")
+ 
+    state["error_log"] = error_log or None
     state["retry_count"] += 1
  
-   
- 
     return state
 
 @traceable
 def reflect_on_errors(state: FileStructureState) -> FileStructureState:
  
-    """Reflects on errors found during code execution,
-    provides suggestions for improvements, and updates the state with feedback."""
+    """Starts a repair pass over the files in error_log. Each failing file
+    is repaired by its own repair_file branch."""
    
     if not state["error_log"]:
         logger.info("No errors found, proceeding to final execution.")
-        return state  
- 
-    logger.info("Reflecting on errors...")
-    error_summary = "\n".join([f"{k}: {v}" for k, v in state["error_log"].items()])
-   
-    prompt = f"""
-    You are an AI software engineer. The following code execution resulted in errors:
- 
-    **Error Summary:**
-    {error_summary}
+        return {}
  
-    Please provide the best suggestions to improve the code and resolve these errors.
-    """
- 
-    response = model.invoke(prompt)
-    code_feedback = response.content.strip()
+    logger.info(f"Reflecting on errors in {len(state['error_log'])} files...")
+    metrics.record_retry("repair")
+    return {}
 
- 
-    state["code_feedback"] = code_feedback
-   
-    return state
+def fan_out_repairs(state: FileStructureState):
+
+    """Sends every failing file, with its error and the project files it
+    imports, to its own repair_file branch."""
+
+    project_files = state.get("project_files") or {}
+    file_structure = state.get("file_structure") or []
+    sends = []
+    for file_path, error in (state.get("error_log") or {}).items():
+        code = project_files.get(file_path, "")
+        dependencies = {
+            dependency: project_files.get(dependency, "")
+            for dependency in imported_files(file_path, code, file_structure)
+        }
+        sends.append(Send("repair_file", {
+            "folder_path": state["folder_path"],
+            "file_path": file_path,
+            "feedback": error,
+            "code": code,
+            "dependencies": dependencies,
+        }))
+    return sends or "validate_code"
+
+@traceable
+def repair_file(task: RepairTask) -> dict:
+
+    """Fixes one failing file from its error output, using the project
+    files it imports as context, and stores the corrected code. The fix is
+    requested as edits in EDIT_MODE "search_replace", with a full rewrite
+    when they do not apply."""
+
+    file_path = task["file_path"]
+    dependency_code = "\n".join(
+        f"""
+        # {dependency}
+        ```python
+        {code}
+        ```"""
+        for dependency, code in task["dependencies"].items()
+    ) or "None"
+
+    context = f"""
+        You are an AI software engineer. The following file failed with errors:
+
+        # {file_path}
+        ```python
+        {task["code"]}
+        ```
+
+        **Error Output:**
+        ```
+        {task["feedback"]}
+        ```
+
+        **Project files it imports (read only):**
+        {dependency_code}
+
+        ### **Constraints:**  
+        - **Fix the errors by changing only this specific file:** {file_path}  
+        - **Keep every name the imported project files rely on.**  
+        """
+
+    fixed_code = None
+    if EDIT_MODE == "search_replace":
+        try:
+            fixed_code = request_edits(context + EDIT_FORMAT_INSTRUCTIONS, file_path, task["code"], "repair_file")
+        except EditError as e:
+            logger.info(f"Could not apply the edits to {file_path}, rewriting it: {e}")
+            metrics.record_retry("edit_fallback")
+    if fixed_code is None:
+        prompt = context + """
+        - **Return the complete corrected file.**  
+        - **Do Not Add Any Thing Likes notes anything extra strict give only the python code**
+        """
+        fixed_code = request_code(prompt, file_path, "repair_file")
+    return {"project_files": {file_path: fixed_code}, "file_hashes": {file_path: content_hash(fixed_code)}}
 
-import requests
 @traceable
 def final_execution(state: FileStructureState) -> FileStructureState:
  
-    """Runs the final version of the error-free code."""
+    """Runs the final version of the error-free code. Every module runs
+    concurrently and is stopped after RUN_TIMEOUT seconds, so modules that
+    start a server no longer block the workflow."""
    
     folder_path = state["folder_path"]
- 
-    for file_path in state["file_structure"]:
-        full_path = os.path.join(folder_path, file_path)
-        if not file_path.endswith(".py"):
-            continue  # Skip non-Python files
- 
-        logger.info(f"Running final version: {file_path}")
-        subprocess.run(["python", full_path])
-    try:
-        logger.info("Fetching Swagger documentation from /docs endpoint...")
-        response = requests.get("http://127.0.0.1:8000/docs", timeout=10)
-        response.raise_for_status()  # Raise an error for HTTP issues
-
-        # Save the documentation to a file
-        with open("documentation.txt", "w") as doc_file:
-            doc_file.write(response.text)
-        logger.info("Swagger documentation saved to documentation.txt")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to fetch Swagger documentation: {e}")
+    requirements = sync_requirements(state)
+    state["flushed"] = flush(state)
+    python = project_python(requirements)
+ 
+    python_files = [file_path for file_path in state["file_structure"] if file_path.endswith(".py")]  # Skip non-Python files
+    logger.info(f"Running final version of {len(python_files)} modules")
+    errors = check_modules(
+        folder_path, python_files, mode="run", timeout=RUN_TIMEOUT,
+        memory_limit_mb=RUN_MEMORY_LIMIT_MB, max_workers=MAX_CONCURRENCY, python=python,
+    )
+    for file_path, error in errors.items():
+        logger.info(f"Final run of {file_path} failed:\n{error}")
  
     return state
 
-import shutil
-from pathlib import Path
 @traceable
-def zip_project_folder(folder_path: str) -> str:
+def zip_project_folder(state: FileStructureState) -> FileStructureState:
     """
-    Compress the entire folder into a zip file.
+    Packages the project. The project folder is the artifact: it is
+    zipped, without environments, caches and other excluded files, while
+    it is downloaded. With WRITE_ARTIFACT_ZIP the archive is also written
+    next to the project folder.
 
     Args:
-        folder_path (str): Path to the folder to be zipped.
+        state (FileStructureState): State holding the folder_path and project_files to be packaged.
 
     Returns:
-        str: Path to the created zip file.
+        FileStructureState: Update with artifact_path, the folder the artifact is packaged from.
     """
-    folder = Path(folder_path)
-    zip_path = folder.with_suffix(".zip")  # e.g., "generated_project.zip"
+    folder_path = state["folder_path"]
+    flushed = flush(state)
+    entries = project_entries(folder_path)
+    logger.info(f"Packaged {len(entries)} files of {folder_path}")
 
-    logger.info(f"Zipping folder: {folder} -> {zip_path}")
-    shutil.make_archive(base_name=str(folder), format="zip", root_dir=folder)
+    if WRITE_ARTIFACT_ZIP:
+        zip_path = str(Path(folder_path).with_suffix(".zip"))  # e.g., "generated_project.zip"
+        logger.info(f"Zipping project: {folder_path} -> {zip_path}")
+        write_atomically(zip_path, stream_zip(folder_path, entries))
 
-    return str(zip_path)
+    return {"artifact_path": folder_path, "flushed": flushed}
 
 def improvement_checker(state: FileStructureState) -> str:
     """
-    Check if the code has been improved based on the feedback.
+    Check if the code has been improved based on the feedback. Another
+    review pass only runs while some file has not converged.
     """
     logger.info("Checking for improvements...")
     improvement_count = state.get("improvement_count", 0)
+    pending = [file_path for file_path in state.get("file_structure") or [] if not is_converged(state, file_path)]
     
-    if improvement_count < 2:
+    if improvement_count < 2 and pending:
         return "reflect"
     return "generate"
 
+def validation_checker(state: FileStructureState) -> str:
+    """
+    Check if static validation found broken files that should be repaired
+    before running the code.
+    """
+    logger.info("Checking validation results...")
+    
+    if state.get("error_log") and state["retry_count"] < 2:
+        return "repair"
+    return "run"
+
 def error_checker(state: FileStructureState) -> str:
     """
     Check if there are any errors in the code execution.
@@ -493,48 +1208,184 @@ def error_checker(state: FileStructureState) -> str:
         return "reflect"
     return "final_execution"
 
-graph = StateGraph(FileStructureState)
-graph.add_node("reflect_on_code", reflect_on_code)
-graph.add_node("improve_code", improve_code)
-graph.add_node("run_code", run_code)
-graph.add_node("final_execution", final_execution)
-graph.add_node("srd_to_file_structure", srd_to_file_structure)
-graph.add_node("create_files", create_files_tool)
-graph.add_node("write_code", write_code_to_files)
-graph.add_node("reflect_on_errors", reflect_on_errors)
-graph.add_node("generate_tests", generate_tests)
-graph.add_node("zip_project_folder", zip_project_folder)
- 
-graph.add_edge(START, "srd_to_file_structure")
-graph.add_edge("srd_to_file_structure", "create_files")
-graph.add_edge("create_files", "write_code")
-graph.add_edge("write_code", "reflect_on_code")
-graph.add_edge("reflect_on_code", "improve_code")
-graph.add_conditional_edges("improve_code", improvement_checker,{"reflect": "reflect_on_code", "generate": "generate_tests"})
-graph.add_edge("improve_code", "generate_tests")
-graph.add_edge("generate_tests", "run_code")
-graph.add_conditional_edges("run_code", error_checker, {"error": "reflect_on_errors", "no_error": "final_execution"})
-graph.add_edge("reflect_on_errors", "improve_code")
-graph.add_edge("final_execution", "zip_project_folder")
-graph.add_edge("zip_project_folder", END)
-
-workflow=graph.compile()
-
-def read_extracted_text():
-    with open("extracted_text.txt", "r") as f:
+def build_graph() -> StateGraph:
+
+    """Builds the uncompiled workflow graph."""
+
+    graph = StateGraph(FileStructureState)
+    nodes = {
+        "reflect_on_code": reflect_on_code,
+        "reflect_file": reflect_file,
+        "improve_code": improve_code,
+        "improve_file": improve_file,
+        "collect_improvements": collect_improvements,
+        "validate_code": validate_code,
+        "run_code": run_code,
+        "final_execution": final_execution,
+        "srd_to_file_structure": srd_to_file_structure,
+        "create_files": create_files_tool,
+        "write_code": write_code_to_files,
+        "reflect_on_errors": reflect_on_errors,
+        "repair_file": repair_file,
+        "generate_tests": generate_tests,
+        "generate_test_file": generate_test_file,
+        "zip_project_folder": zip_project_folder,
+    }
+    # Every node is timed and the model calls it makes are attributed to it.
+    for name, node in nodes.items():
+        graph.add_node(name, metrics.instrument_node(name, node))
+
+    graph.add_edge(START, "srd_to_file_structure")
+    graph.add_edge("srd_to_file_structure", "create_files")
+    graph.add_edge("create_files", "write_code")
+    graph.add_edge("write_code", "reflect_on_code")
+    graph.add_conditional_edges("reflect_on_code", fan_out_reflection, ["reflect_file", "improve_code"])
+    graph.add_edge("reflect_file", "improve_code")
+    graph.add_conditional_edges("improve_code", fan_out_improvements, ["improve_file", "collect_improvements"])
+    graph.add_edge("improve_file", "collect_improvements")
+    graph.add_conditional_edges("collect_improvements", improvement_checker,{"reflect": "reflect_on_code", "generate": "generate_tests"})
+    graph.add_conditional_edges("generate_tests", fan_out_tests, ["generate_test_file", "validate_code"])
+    graph.add_edge("generate_test_file", "validate_code")
+    graph.add_conditional_edges("validate_code", validation_checker, {"repair": "reflect_on_errors", "run": "run_code"})
+    graph.add_conditional_edges("run_code", error_checker, {"reflect": "reflect_on_errors", "final_execution": "final_execution"})
+    graph.add_conditional_edges("reflect_on_errors", fan_out_repairs, ["repair_file", "validate_code"])
+    graph.add_edge("repair_file", "validate_code")
+    graph.add_edge("final_execution", "zip_project_folder")
+    graph.add_edge("zip_project_folder", END)
+
+    return graph
+
+@lru_cache(maxsize=None)
+def get_checkpointer():
+
+    """Returns the shared SQLite checkpointer, or None when CHECKPOINT_DB is
+    set to an empty value."""
+
+    if not CHECKPOINT_DB:
+        return None
+
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    return SqliteSaver(sqlite3.connect(CHECKPOINT_DB, check_same_thread=False))
+
+@lru_cache(maxsize=None)
+def get_workflow():
+
+    """Compiles the workflow graph on first use and returns the same compiled
+    graph afterwards."""
+
+    return build_graph().compile(checkpointer=get_checkpointer())
+
+def run_config(thread_id: str) -> dict:
+
+    """Returns the invoke config of the run with the given thread id."""
+
+    # Per-file branches started with Send run in parallel, up to MAX_CONCURRENCY
+    # at a time. The callback handler records every model call of the run.
+    return {"max_concurrency": MAX_CONCURRENCY, "callbacks": [metrics.CALLBACK_HANDLER], "configurable": {"thread_id": thread_id}}
+
+def create_initial_state(srd_text: str, folder_path: str = "generated_project") -> FileStructureState:
+
+    """Returns the state a workflow run starts from."""
+
+    return {
+        "srd_text": srd_text,
+        "file_structure": None,
+        "file_descriptions": None,
+        "folder_path": folder_path,
+        "error_log": None,
+        "retry_count": 0,
+        "code_feedback": None
+    }
+
+def read_extracted_text(path: str = "extracted_text.txt") -> str:
+    with open(path, "r") as f:
         return f.read()
-srd_text_doc = read_extracted_text()
 
+def log_cache_statistics() -> None:
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        logger.info(f"LLM cache statistics: {llm_cache.stats()}")
+
+def write_run_profile(thread_id: str, folder_path: str) -> None:
+
+    """Writes the timing and token profile of a run to profile.json next to
+    the project folder."""
+
+    profile_path = os.path.join(os.path.dirname(folder_path), "profile.json")
+    if metrics.write_profile(thread_id, profile_path) is not None:
+        logger.info(f"Run profile saved to {profile_path}")
+
+def run(srd_text: str, folder_path: str = "generated_project", thread_id: Optional[str] = None) -> FileStructureState:
+
+    """Runs the workflow graph for an SRD document and returns the final
+    state. The run is checkpointed under thread_id, a new id by default."""
+
+    thread_id = thread_id or uuid.uuid4().hex
+    logger.info(f"Starting run {thread_id}")
+    try:
+        final_state = get_workflow().invoke(create_initial_state(srd_text, folder_path), config=run_config(thread_id))
+    finally:
+        write_run_profile(thread_id, folder_path)
+
+    log_cache_statistics()
+    return final_state
+
+def resume(thread_id: str) -> FileStructureState:
+
+    """Continues a checkpointed run from its last completed node. Nodes, and
+    parallel branches, that already finished are not run again."""
+
+    logger.info(f"Resuming run {thread_id}")
+    final_state = get_workflow().invoke(None, config=run_config(thread_id))
+    write_run_profile(thread_id, final_state["folder_path"])
 
-initial_state = {
-    "srd_text": srd_text_doc,
-    "file_structure": None,
-    "file_descriptions": None,
-    "folder_path": "generated_project",
-    "error_log": None,
-    "retry_count": 0,
-    "code_feedback": None
-}
+    log_cache_statistics()
+    return final_state
+
+def replay(thread_id: str, node: str) -> FileStructureState:
+
+    """Runs a single node of a checkpointed run again, starting from the
+    latest checkpoint taken before it, and stops once it completed. The run
+    can then be continued with resume.
+
+    Raises:
+        ValueError: If the run never reached the node.
+    """
+
+    workflow = get_workflow()
+    for snapshot in workflow.get_state_history({"configurable": {"thread_id": thread_id}}):
+        if node in snapshot.next:
+            logger.info(f"Replaying {node} of run {thread_id}")
+            final_state = workflow.invoke(None, config={**run_config(thread_id), **snapshot.config}, interrupt_after=[node])
+            write_run_profile(thread_id, final_state["folder_path"])
+            return final_state
+    raise ValueError(f"Run {thread_id} never reached node {node}")
+
+def main(argv: Optional[List[str]] = None) -> None:
+
+    """Command line entry point: generates a project from an extracted SRD
+    text file, or resumes or replays a checkpointed run."""
+
+    parser = argparse.ArgumentParser(description="Generate a project from an SRD document.")
+    parser.add_argument("--srd", default="extracted_text.txt", help="Path to the extracted SRD text.")
+    parser.add_argument("--folder", default="generated_project", help="Folder the project is generated in.")
+    parser.add_argument("--thread-id", help="Id the run is checkpointed under.")
+    parser.add_argument("--resume", action="store_true", help="Continue the run given by --thread-id from its last completed node.")
+    parser.add_argument("--replay", metavar="NODE", help="Run NODE of the run given by --thread-id again and stop after it.")
+    args = parser.parse_args(argv)
+
+    if (args.resume or args.replay) and not args.thread_id:
+        parser.error("--resume and --replay require --thread-id")
+
+    logging.basicConfig(level=logging.INFO)
+    if args.replay:
+        replay(args.thread_id, args.replay)
+    elif args.resume:
+        resume(args.thread_id)
+    else:
+        run(read_extracted_text(args.srd), args.folder, args.thread_id)
 
 
-workflow.invoke(initial_state)
\ No newline at end of file
+if __name__ == "__main__":
+    main()